@@ -1,9 +1,13 @@
-from dagster import Definitions, load_assets_from_modules
+from dotenv import load_dotenv
 
-from . import assets
+# every setting of the pipeline can be given in a .env file. it is loaded once, here, before any module reads it
+load_dotenv()
 
-all_assets = load_assets_from_modules([assets])
 
-defs = Definitions(
-    assets=all_assets,
-)
+def __getattr__(name):
+    # the dagster definitions (and with them dagster, pandas and the rest) are only imported when they are asked for,
+    # so the command line interface starts quickly. dagster itself loads them from axioparse_pipeline.definitions
+    if name == "defs":
+        from .definitions import defs
+        return defs
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,38 +1,32 @@
-from dagster import asset
+from dagster import AssetExecutionContext
 import os
 import pandas as pd
 import numpy as np
-from . import extra_functions
-from biom import Table
-import json
-import io
-from dagster import asset
-from Bio import Entrez
-import time
-import re
-from dotenv import load_dotenv
-import warnings
+from . import extra_functions, normalization, taxonomy_manifest
+from .otu_matrix import OtuMatrix
+from .instrumentation import instrumented_asset, ncbi_requests_healthy
 
 # ASSIGN GLOBAL VARIABLES
-load_dotenv()
-Entrez.email = os.getenv("NCBI_EMAIL")
-Entrez.api_key = os.getenv("NCBI_KEY")
-OTU_IN_PATH = './data/otu_table.txt'
-METADATA_IN_PATH = './data/metadata.csv'
-SPEC_COV_IN_PATH = './data/array_species_coverage.csv'
+OTU_IN_PATH = os.getenv("AXIOPARSE_OTU_IN_PATH", './data/otu_table.txt')
+METADATA_IN_PATH = os.getenv("AXIOPARSE_METADATA_IN_PATH", './data/metadata.csv')
+SPEC_COV_IN_PATH = os.getenv("AXIOPARSE_SPEC_COV_IN_PATH", './data/array_species_coverage.csv')
+OUT_DIR = os.getenv("AXIOPARSE_OUT_DIR", './data_out')
+CSV_ENGINE = os.getenv("AXIOPARSE_CSV_ENGINE", "c")
+BIOM_FORMAT = os.getenv("AXIOPARSE_BIOM_FORMAT", "json").lower()
 
 ### ASSETS TO READ IN THE DATA AND PREP FOLDERS
-@asset(group_name="read_data")
-def read_otu():
+@instrumented_asset(group_name="read_data")
+def read_otu(read_metadata):
     '''
-    Step R.2: upload the otu table as a dataframe, do some formatting
+    Step R.2: upload the otu table as a dataframe, do some formatting. only the columns of samples listed in the
+    metadata (and their RNA columns) are read, straight into a small categorical dtype
     '''
-    otu_table = pd.read_csv(OTU_IN_PATH, sep='\t')
+    otu_table = extra_functions.read_otu_table(OTU_IN_PATH, read_metadata, engine=CSV_ENGINE)
     otu_table.sort_values(by="Target Description", inplace=True)
     otu_table.rename(columns={"Target Description":"Probe"}, inplace=True)
     return otu_table
 
-@asset(group_name="read_data")
+@instrumented_asset(group_name="read_data")
 def read_metadata():
     '''
     Step R.1: upload the metadata file as a dataframe
@@ -40,7 +34,7 @@ def read_metadata():
     metadata = pd.read_csv(METADATA_IN_PATH)
     return metadata
 
-@asset(group_name="read_data")
+@instrumented_asset(group_name="read_data")
 def read_species_coverage():
     '''
     Step R.3: upload the species coverage file as a dataframe, do some formatting
@@ -51,16 +45,15 @@ def read_species_coverage():
 
 
 #### ASSETS TO CLEAN THE OTU TABLE
-@asset(group_name="clean_otu_table")
+@instrumented_asset(group_name="clean_otu_table")
 def replace_sample_names(read_otu, read_metadata):
     '''
     Step O.1: replace column headers in otu table with sample_id from metadata
     '''
     id_mapping = dict(zip(read_metadata['array_id'], read_metadata['sample_id']))
-    read_otu.rename(columns=id_mapping, inplace=True)
-    return read_otu
+    return read_otu.rename(columns=id_mapping)
 
-@asset(group_name="clean_otu_table")
+@instrumented_asset(group_name="clean_otu_table")
 def merge_samples_to_otu(replace_sample_names, read_species_coverage):
     '''
     Step O.2: merge the species column from species coverage onto the otu table
@@ -76,104 +69,79 @@ def merge_samples_to_otu(replace_sample_names, read_species_coverage):
 
     return merged
 
-@asset(group_name="clean_otu_table")
+@instrumented_asset(group_name="clean_otu_table")
 def replace_species_names(merge_samples_to_otu, enrich_taxonomy_table):
     '''
-    Step O.3: Replace species names using updated taxonomy information
+    Step O.3: Replace species names using updated taxonomy information. from here on the otu table is held as a sparse
+    OtuMatrix of detection states with one row per probe
     '''
     otu_table = merge_samples_to_otu
-    otu_table = otu_table.rename(columns={"Species": "Old Species"})
 
     # create mapping dictionary
     mapping = dict(zip(enrich_taxonomy_table["Original Species"], enrich_taxonomy_table["Species"]))
-    otu_table["Species"] = otu_table["Old Species"].map(mapping)
+    species = normalization.map_species(otu_table["Species"], mapping)
 
     # throw error if mapping isn't complete
-    if otu_table["Species"].isnull().any():
-        unmatched = otu_table.loc[otu_table['Species'].isnull(), "Old Species"].tolist()
+    if pd.isnull(species).any():
+        unmatched = otu_table.loc[pd.isnull(species), "Species"].tolist()
         raise ValueError(f"The following species values could not be matched in replace_species_names: {unmatched}. Check that all species are searched properly when Taxonomy API is searched")
-    
-    # reorganize the columns in otu table to have species first
-    otu_table = otu_table.drop(columns=["Old Species", "Probe"])
-    cols = ["Species"] + [col for col in otu_table.columns if col != "Species"]
-
-    # re-sort the columns by species so that remove_duplicates works
-    otu_table = otu_table[cols].sort_values(by="Species")
 
-    return otu_table
+    return OtuMatrix.from_frame(otu_table.drop(columns=["Probe"]).assign(Species=species))
 
 
-@asset(group_name="clean_otu_table")
+@instrumented_asset(group_name="clean_otu_table")
 def remove_duplicates(replace_species_names):
     '''
-    Step O.4: aggregates data for duplicate species and then empties and deletes duplicate rows.
-    Note: aggregates into DETECTED or Secondary. user can add print statement at the end of this function to output
-    a table aggregated based on species but with all original columns. 
-    '''
-
-    for i in range(0, len(replace_species_names)-1):
-        if replace_species_names.iloc[i,0] == replace_species_names.iloc[i+1,0]:
-            for j in range(2, len(replace_species_names.iloc[0,:])):
-                test_if = False
-
-                if pd.isna(replace_species_names.iloc[i,j]) and pd.isna(replace_species_names.iloc[i+1,j]):
-                    test_if=True
-                
-                elif ((replace_species_names.iloc[i, j] == "Secondary") and (replace_species_names.iloc[i + 1, j] == "Secondary")) or \
-                     ((replace_species_names.iloc[i, j] == "Secondary") and (pd.isna(replace_species_names.iloc[i + 1, j]))) or \
-                     ((pd.isna(replace_species_names.iloc[i, j])) and (replace_species_names.iloc[i + 1, j] == "Secondary")):
-                    replace_species_names.iloc[i+1, j] = "Secondary"
-                    test_if = True
-                
-                elif (replace_species_names.iloc[i, j] == "DETECTED") or (replace_species_names.iloc[i+1, j] == "DETECTED"):
-                    replace_species_names.iloc[i+1, j] = "DETECTED"
-                    test_if = True
-
-                else:
-                    raise ValueError(f"ERROR: Lines not condensed at row {i} and column {j}")
-                
-            if test_if:
-                for j in range(0, len(replace_species_names.iloc[0,:])):
-                    replace_species_names.iloc[i, j] = np.nan
-    
-    replace_species_names.dropna(subset=[replace_species_names.columns[0]], axis=0, inplace=True)
+    Step O.4: aggregates data for duplicate species into a single row per species. every cell is encoded as an
+    ordered state (missing < Secondary < DETECTED) so that each species keeps the strongest call seen in any of its
+    rows, which means the input does not need to be sorted.
+    '''
+    # throw error if any cell is not empty, Secondary or DETECTED
+    replace_species_names.check_condensed()
 
-    return replace_species_names
+    # take the strongest state per species, sorted by species
+    return replace_species_names.group_max()
 
-@asset(group_name="clean_otu_table")
-def combine_dna_rna_probes(remove_duplicates):
+@instrumented_asset(group_name="clean_otu_table")
+def combine_dna_rna_probes(remove_duplicates, read_metadata):
     '''
-    Step O.5: combines all dna and rna probes and makes all dna values binary
+    Step O.5: combines all dna and rna probes and makes all dna values binary. dna columns are paired with their rna
+    column by array id, and a sample is marked 1 if either probe was called.
     '''
-    result_df = remove_duplicates.apply(extra_functions.aggregate_row_to_binary, axis=1, result_type='expand')
+    pairs = extra_functions.pair_dna_rna_columns(remove_duplicates.samples, read_metadata)
+    dna_present = remove_duplicates.select_samples([dna for dna, _ in pairs]).values.astype(bool)
+    rna_present = remove_duplicates.select_samples([rna for _, rna in pairs]).values.astype(bool)
+    presence = (dna_present + rna_present).astype(np.uint8)
 
-    return result_df
+    return OtuMatrix(presence, remove_duplicates.species, [dna for dna, _ in pairs])
 
-@asset(group_name="clean_otu_table")
+@instrumented_asset(group_name="clean_otu_table")
 def delete_extra_samples(combine_dna_rna_probes, read_metadata):
     '''
     Step O.6: deletes all columns where the axiom id was not replaced with a sample id (the sample does not have
     corresponding metadata)
     '''
     sample_ids = set(read_metadata["sample_id"])
-    filtered_list = [item for item in combine_dna_rna_probes.columns if ((item in sample_ids) or (item == "Species"))]
-    
-    return combine_dna_rna_probes[filtered_list]
+    filtered_list = [item for item in combine_dna_rna_probes.samples if item in sample_ids]
+
+    return combine_dna_rna_probes.select_samples(filtered_list)
 
-@asset(group_name="clean_otu_table")
+@instrumented_asset(group_name="clean_otu_table")
 def cut_probe_names(delete_extra_samples):
     '''
-    Step O.7: delete probe names from otu table
+    Step O.7: delete probe names from otu table. the R output is a dense table, so this is where the sparse otu matrix
+    is expanded
     '''
-    delete_extra_samples.sort_values(by="Species", inplace=True)
-    delete_extra_samples.drop(columns=['Species'], inplace=True)
-    delete_extra_samples.reset_index(drop=True, inplace=True)
+    otu_table = delete_extra_samples.sort_species().to_frame()
+    otu_table.drop(columns=['Species'], inplace=True)
 
-    return delete_extra_samples
+    return otu_table
 
 
 # ASSETS TO PREPARE THE TAXONOMY TABLE
-@asset(group_name="clean_tax_table")
+TAX_COLUMNS = ['Domain', 'Kingdom', 'Phylum', 'Class', 'Order', 'Family', 'Genus', 'Species', 'Original Species']
+
+@instrumented_asset(group_name="clean_tax_table")
 def filter_taxa(read_species_coverage, merge_samples_to_otu):
     '''
     Step T.1: filter the taxonomy table to include phylogeny information on otus in the otu table. do some extra
@@ -182,88 +150,84 @@ def filter_taxa(read_species_coverage, merge_samples_to_otu):
 
     species_cov = read_species_coverage[read_species_coverage['Species'].isin(merge_samples_to_otu['Species'])]
     tax_table = species_cov[["Domain", "Family", "Species"]]
-    tax_table.drop_duplicates(subset=['Species'], inplace=True)
-    tax_table.sort_values(by="Species", inplace=True) 
-    tax_table.reset_index(drop=True, inplace=True)
+    tax_table = tax_table.drop_duplicates(subset=['Species'])
+    tax_table = tax_table.sort_values(by="Species")
+    tax_table = tax_table.reset_index(drop=True)
 
     return tax_table
 
-@asset(group_name="clean_tax_table")
-def enrich_taxonomy_table(read_species_coverage, filter_taxa):
+@instrumented_asset(group_name="clean_tax_table", checks=[ncbi_requests_healthy])
+def enrich_taxonomy_table(context: AssetExecutionContext, read_species_coverage, filter_taxa):
     """
     Step T.2: For each Species in tax_table, search the NCBI Taxonomy database to get full taxonomic info.
-    If not found, attempt probe-based fallback search. Raise error if any entries fail.
+    If not found, attempt probe-based fallback search. All lineages are then fetched together in batched efetch calls.
+    Raise error if any entries fail.
+    Species already listed in the taxonomy manifest of this species coverage file are joined from it without any
+    lookups. Remaining lookups are served from the on-disk NCBI cache where possible and otherwise run concurrently
+    through the rate-limited NCBI client; manifest, cache, request and fallback-search statistics are added to the
+    metadata.
     """
-
-    failed_species = []
-    taxonomy_rows = []
     tax_table = filter_taxa
 
-    # throw an error if api email and key aren't loaded in
-    extra_functions.validate_api()
-
-    for _, row in tax_table.iterrows():
-        original_species = row['Species']
-
-        # do initial search with species
-        tax_id_list = extra_functions.search_ncbi_taxonomy(original_species)
-        tax_id_list = [tid for tid in tax_id_list if tid.strip().isdigit()]
-
-        # attempt fallback search using probe name if tax_id_list is empty or too long
-        if (not tax_id_list) or (len(tax_id_list) > 5):
-            matching_probe_row = read_species_coverage[read_species_coverage["Species"] == original_species]
-            probe_name = matching_probe_row.iloc[0]['Probe']
-            print(f"using fallback search for Original Species: {original_species} and Probe: {probe_name}")
-            tax_id_list = extra_functions.fallback_search(probe_name)
-            tax_id_list = [tid for tid in tax_id_list if tid.strip().isdigit()]
-
-        # if original and fallback searches failed, append to failed list
-        if not tax_id_list:
-            warnings.warn(f"skipping rest of loop because {original_species} failed search at checkpoint 1")
-            failed_species.append(original_species)
-            continue
-
-        # take the first match and collect the taxonomy data for that taxa id. if this fails, append to failed list
-        best_tax_id = tax_id_list[0]
-        taxonomy_info = extra_functions.fetch_taxonomy_data(best_tax_id, original_species, 3)
-        if not taxonomy_info:
-            warnings.warn(f"skipping rest of loop because {original_species} failed search at checkpoint 2. returned taxonomy info is {taxonomy_info}")
-            failed_species.append(original_species)
-            continue
-            
-        # grab domain from species coverage spreadsheet because NCBI doesn't have it
-        domain = re.sub(r'(_noFamily|Families)$', '', row["Domain"])
-
-        # extract lineage info into a dictionary, add that to taxonomy_rows
-        lineage = {d['Rank']: d['ScientificName'] for d in taxonomy_info.get('LineageEx', [])}
-        lineage.update({'Domain': str(domain),
-                        'Kingdom': str(lineage.get('kingdom', '')),
-                        'Phylum': str(lineage.get('phylum', '')),
-                        'Class': str(lineage.get('class', '')),
-                        'Order': str(lineage.get('order', '')),
-                        'Family': str(lineage.get('family', '')),
-                        'Genus': str(lineage.get('genus', '')),
-                        'Species': str(taxonomy_info.get('ScientificName', '')),
-                        'Original Species': str(original_species)
-        })
-        taxonomy_rows.append(lineage)
+    # throw an error if api email and key aren't loaded in. not needed when running from a local taxdump index
+    if not extra_functions.TAXDUMP_INDEX_DIR:
+        extra_functions.validate_api()
+    cache = extra_functions.get_taxonomy_cache()
+    cache.reset_stats()
+    client = extra_functions.get_ncbi_client()
+    client.reset_stats()
+    extra_functions.reset_search_stats()
+
+    # the client's request threads are shut down once the lookups are done
+    with client:
+        # resolve the whole species coverage file once if asked to, so later runs are a join against the manifest. the
+        # manifest expires and is rebuilt like the cache entries it was built from
+        backend = extra_functions.taxonomy_backend()
+        manifest = taxonomy_manifest.load_manifest(read_species_coverage, backend, ttl_seconds=cache.ttl_seconds,
+                                                   refresh=cache.refresh)
+        manifest_failed = []
+        if manifest is None and taxonomy_manifest.BUILD_MANIFEST:
+            all_species = read_species_coverage.drop_duplicates(subset=['Species'])[["Domain", "Species"]]
+            manifest_rows, manifest_failed = extra_functions.resolve_taxonomy(all_species, read_species_coverage)
+            manifest = taxonomy_manifest.write_manifest(read_species_coverage, backend,
+                                                        pd.DataFrame(manifest_rows, columns=TAX_COLUMNS))
+            if manifest_failed:
+                context.log.warning(f"{len(manifest_failed)} species of the coverage file could not be resolved and "
+                                    f"were left out of the taxonomy manifest: {manifest_failed}")
+
+        # look up the species that are missing from the manifest
+        if manifest is None:
+            manifest = pd.DataFrame(columns=TAX_COLUMNS)
+        missing = tax_table[~tax_table['Species'].isin(manifest['Original Species'])]
+        taxonomy_rows, failed_species = extra_functions.resolve_taxonomy(missing, read_species_coverage)
+
+    # record which cache entries were used and trim the cache, once for the whole run
+    cache.flush()
+
+    context.log.info(f"Taxonomy manifest hits: {len(tax_table) - len(missing)}, NCBI cache hits: {cache.hits}, misses: {cache.misses}")
+    # the asset's checks are outputs too, so the metadata names the output it belongs to
+    context.add_output_metadata({"taxonomy_manifest_hits": len(tax_table) - len(missing),
+                                 "taxonomy_manifest_failed": len(manifest_failed),
+                                 "taxonomy_lookups": len(missing), **cache.stats(), **client.stats(),
+                                 **extra_functions.search_stats()}, output_name="result")
 
     if failed_species:
         raise ValueError(f"Failed to find taxonomy for the following species:\n{failed_species}")
 
-    # construct pandas dataframe from taxonomy_rows
-    tax_df = pd.DataFrame(taxonomy_rows)[['Domain', 'Kingdom', 'Phylum', 'Class', 'Order', 'Family', 'Genus', 'Species', 'Original Species']]
+    # construct pandas dataframe from the manifest and taxonomy_rows, in the order of tax_table
+    tax_df = pd.concat([manifest, pd.DataFrame(taxonomy_rows, columns=TAX_COLUMNS)], ignore_index=True)
+    tax_df = tax_df.set_index('Original Species', drop=False).loc[tax_table['Species']].reset_index(drop=True)
 
-    return tax_df
+    return tax_df[TAX_COLUMNS]
 
-@asset(group_name="clean_tax_table")
+@instrumented_asset(group_name="clean_tax_table")
 def remove_duplicate_species(enrich_taxonomy_table):
     '''
     Step T.3: Remove any duplicate species names added while searching the taxonomy table. If there are any duplicates,
     ensure Original Species column contains all the original species for the new one.
     '''
 
-    enrich_taxonomy_table.sort_values(by="Species", inplace=True)
+    enrich_taxonomy_table = enrich_taxonomy_table.sort_values(by="Species")
     agg_og = enrich_taxonomy_table.groupby("Species", as_index=False).agg({"Original Species": lambda x: ", ".join(sorted(set(x)))})
     drop_dups = enrich_taxonomy_table.drop_duplicates(subset="Species", keep="first").drop(columns=["Original Species"])
     final_df = pd.merge(agg_og, drop_dups, on="Species").sort_values(by="Species", inplace=False)
@@ -273,52 +237,42 @@ def remove_duplicate_species(enrich_taxonomy_table):
     
     return final_df[cols]
 
-@asset(group_name="clean_tax_table")
+@instrumented_asset(group_name="clean_tax_table")
 def format_tax_for_qiime(remove_duplicate_species):
     '''
     Step T.4: Reformat taxonomy data into a single column that can be added to otu table
     '''
-    remove_duplicate_species.sort_values(by="Species", inplace=True)
-    remove_duplicate_species["Full Taxonomy"] = remove_duplicate_species.apply(
-        lambda row: f'd_{row["Domain"]}; k_{row["Kingdom"]}; p_{row["Phylum"]}; c_{row["Class"]}; o_{row["Order"]}; f_{row["Family"]}; g_{row["Genus"]}; s_{row["Species"]}', axis=1)
-    remove_duplicate_species.reset_index(drop=True, inplace=True)
-    remove_duplicate_species.rename(columns={"Species":"Feature ID", "Full Taxonomy":"Taxon"}, inplace=True)
-    remove_duplicate_species.drop(columns=["Domain", "Kingdom", "Phylum", "Class", "Order", "Family", "Genus", "Original Species"], inplace=True)
+    tax_table = remove_duplicate_species.sort_values(by="Species")
+    tax_table["Full Taxonomy"] = normalization.taxonomy_strings(tax_table)
+    tax_table.reset_index(drop=True, inplace=True)
+    tax_table.rename(columns={"Species":"Feature ID", "Full Taxonomy":"Taxon"}, inplace=True)
+    tax_table.drop(columns=["Domain", "Kingdom", "Phylum", "Class", "Order", "Family", "Genus", "Original Species"], inplace=True)
 
-    return remove_duplicate_species
+    return tax_table
 
-@asset(group_name="clean_otu_table")
+@instrumented_asset(group_name="clean_otu_table")
 def format_ids_for_qiime(delete_extra_samples):
 
     '''
-    Step O.6: manage any special characters present in species names to ensure QIIME2 can handle them 
+    Step O.6: manage any special characters present in species names to ensure QIIME2 can handle them. raises an
+    error if two species end up with the same id
     '''
-    delete_extra_samples.reset_index(drop=True, inplace=True)
-    delete_extra_samples.sort_values(by="Species", inplace=True)
-    delete_extra_samples.rename(columns={"Species":"#OTU ID"}, inplace=True)
-    delete_extra_samples['#OTU ID'] = delete_extra_samples['#OTU ID'].str.replace(' ', '_')
-    delete_extra_samples['#OTU ID'] = delete_extra_samples['#OTU ID'].str.replace(r'[\(\)\[\]:]', '*', regex=True)
-    delete_extra_samples['#OTU ID'] = delete_extra_samples['#OTU ID'].str.replace('*_', '_')
-    delete_extra_samples['#OTU ID'] = delete_extra_samples['#OTU ID'].str.replace('*', '_')
-    delete_extra_samples['#OTU ID'] = delete_extra_samples['#OTU ID'].str.rstrip('_')
-    delete_extra_samples['#OTU ID'] = delete_extra_samples['#OTU ID'].str.lstrip('_')
-    delete_extra_samples['#OTU ID'] = delete_extra_samples['#OTU ID'].str.replace('_', ' ')
+    otu_matrix = delete_extra_samples.sort_species()
+    otu_ids = normalization.sanitize_otu_ids(otu_matrix.species)
 
-    delete_extra_samples.set_index('#OTU ID', inplace=True)
-
-    return delete_extra_samples
+    return OtuMatrix(otu_matrix.values, otu_ids, otu_matrix.samples)
 
 # ASSETS TO WRITE FILES FOR QIIME2 AND R
-@asset(group_name="write_data")
+@instrumented_asset(group_name="write_data")
 def write_metadata_r(read_metadata):
     '''
     Step W.2: write metadata into a CSV so that it is useable in the microbiomestat package of R
     '''
-    read_metadata.set_index('sample_id', inplace=True)
-    read_metadata.index.name = None
-    read_metadata.to_csv('./data_out/metadata_r.csv')
+    metadata = read_metadata.set_index('sample_id')
+    metadata.index.name = None
+    metadata.to_csv(os.path.join(OUT_DIR, 'metadata_r.csv'))
 
-@asset(group_name="write_data")
+@instrumented_asset(group_name="write_data")
 def write_metadata_qiime(read_metadata):
     '''
     Step W.1: write metadata into a .txt as TSV so that it is useable in qiime2
@@ -331,40 +285,53 @@ def write_metadata_qiime(read_metadata):
     read_metadata = pd.concat([new_row, read_metadata], ignore_index=True)
     read_metadata.rename(columns={'sample_id':'sample-id'}, inplace=True)
 
-    read_metadata.to_csv('./data_out/metadata_qiime.txt', sep='\t', index=False)
+    read_metadata.to_csv(os.path.join(OUT_DIR, 'metadata_qiime.txt'), sep='\t', index=False)
 
-@asset(group_name="write_data")
+@instrumented_asset(group_name="write_data")
 def write_otu_r(cut_probe_names):
     '''
     Step W.4: write otu table into a csv for r and microbiomestat compatibility
     '''
-    cut_probe_names.to_csv('./data_out/otu_table_r.csv')
+    cut_probe_names.to_csv(os.path.join(OUT_DIR, 'otu_table_r.csv'))
 
-@asset(group_name="write_data")
+@instrumented_asset(group_name="write_data")
 def write_otu_qiime(format_ids_for_qiime):
     '''
-    Step W.3: write otu table into biom format
+    Step W.3: write otu table into biom format. the table is streamed to disk as BIOM 1.0 JSON, or written as compressed
+    BIOM 2.1 HDF5 if BIOM_FORMAT is hdf5. qiime2 imports either one
     '''
-    format_ids_for_qiime.index = format_ids_for_qiime.index.str.replace(" ", "_")
-    format_ids_for_qiime.columns = format_ids_for_qiime.columns.str.replace(" ", "_")
+    if BIOM_FORMAT not in ("json", "hdf5"):
+        raise ValueError(f"Unknown biom format {BIOM_FORMAT!r} in AXIOPARSE_BIOM_FORMAT, expected json or hdf5")
+
+    # biom is only needed here, so it is not imported with the rest of the pipeline
+    from biom import Table
+    from biom.util import biom_open
+
+    observation_ids = [otu_id.replace(" ", "_") for otu_id in format_ids_for_qiime.species]
+    sample_ids = [str(sample_id).replace(" ", "_") for sample_id in format_ids_for_qiime.samples]
+
+    # the biom table is built straight from the sparse matrix
+    biom_table = Table(format_ids_for_qiime.values, observation_ids, sample_ids)
 
-    biom_table = Table(format_ids_for_qiime.values, format_ids_for_qiime.index, format_ids_for_qiime.columns)
-    biom_json = biom_table.to_json(generated_by="axioparse", direct_io=False)
-    with open("./data_out/otu_table_qiime.biom", "w") as biom_file:
-        json.dump(json.loads(biom_json), biom_file, indent=4)
+    if BIOM_FORMAT == "hdf5":
+        with biom_open(os.path.join(OUT_DIR, "otu_table_qiime.biom"), "w") as biom_file:
+            biom_table.to_hdf5(biom_file, generated_by="axioparse", compress=True)
+    else:
+        with open(os.path.join(OUT_DIR, "otu_table_qiime.biom"), "w") as biom_file:
+            biom_table.to_json(generated_by="axioparse", direct_io=biom_file)
 
-@asset(group_name="write_data")
+@instrumented_asset(group_name="write_data")
 def write_taxonomy_r(remove_duplicate_species):
     '''
     Step W.6: write the taxonomy table to a csv compatible with r and microbiomestat
     '''
-    remove_duplicate_species.to_csv('./data_out/taxonomy_r.csv', index=False)
+    remove_duplicate_species.to_csv(os.path.join(OUT_DIR, 'taxonomy_r.csv'), index=False)
 
 
-@asset(group_name="write_data")
+@instrumented_asset(group_name="write_data")
 def write_taxonomy_qiime(format_tax_for_qiime):
     '''
     Step W.5: write taxonomy table to .txt for qiime compatibility
     '''
 
-    format_tax_for_qiime.to_csv('./data_out/taxonomy_qiime.txt', sep='\t', index = False)
+    format_tax_for_qiime.to_csv(os.path.join(OUT_DIR, 'taxonomy_qiime.txt'), sep='\t', index = False)
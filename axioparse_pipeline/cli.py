@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+
+# command line arguments are passed to the pipeline through the environment variables its modules read on import
+PATH_SETTINGS = {"otu_table": "AXIOPARSE_OTU_IN_PATH", "metadata": "AXIOPARSE_METADATA_IN_PATH",
+                 "species_coverage": "AXIOPARSE_SPEC_COV_IN_PATH", "out_dir": "AXIOPARSE_OUT_DIR"}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="axioparse", description="Run the AxioParse pipeline without the Dagster UI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="materialize the assets in this process",
+                              description="Materialize the asset graph (or the --select part of it) in this process. "
+                                          "Paths default to the .env file, then to ./data and ./data_out.")
+    run.add_argument("--otu-table", help="tab separated otu table exported from the Axiom software")
+    run.add_argument("--metadata", help="metadata csv with a sample_id and array_id column")
+    run.add_argument("--species-coverage", help="array species coverage csv")
+    run.add_argument("--out-dir", help="directory the qiime2 and R files are written to, created if missing")
+    run.add_argument("--select", nargs="+", metavar="SELECTION",
+                     help="assets to materialize, e.g. read_otu, *write_otu_qiime (with everything upstream), "
+                          "read_otu+ (and its children) or group:write_data. everything by default. selected assets "
+                          "load their inputs from earlier runs, which needs a persistent DAGSTER_HOME")
+    return parser
+
+
+def run(args):
+    '''
+    Materialize the selected assets in process and return the exit status
+    '''
+    for arg, variable in PATH_SETTINGS.items():
+        if getattr(args, arg) is not None:
+            os.environ[variable] = getattr(args, arg)
+    # a single run processes every array run at once, so the partitioned assets (meant for the sensor) are not used
+    os.environ["AXIOPARSE_PARTITION_BY_RUN"] = "false"
+
+    # dagster, pandas and the pipeline are only imported once the settings are in place
+    from dagster import AssetSelection, DagsterInstance, materialize
+    from . import assets, definitions
+
+    os.makedirs(assets.OUT_DIR, exist_ok=True)
+    selection = None
+    if args.select:
+        selection = AssetSelection.groups(*[item[len("group:"):] for item in args.select if item.startswith("group:")])
+        for item in args.select:
+            if not item.startswith("group:"):
+                selection = selection | AssetSelection.from_string(item)
+
+    instance = DagsterInstance.get() if os.getenv("DAGSTER_HOME") else DagsterInstance.ephemeral()
+    with instance:
+        result = materialize(definitions.all_assets, instance=instance,
+                             resources=definitions.all_resources, selection=selection, raise_on_error=False)
+
+    return 0 if result.success else 1
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "run":
+        return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+from dagster_duckdb import DuckDBResource
+import os
+import numpy as np
+from . import assets
+from .instrumentation import instrumented_asset
+
+# the parquet and duckdb writers below are added to the write_data group by AXIOPARSE_COLUMNAR_EXPORT, see definitions
+DUCKDB_OUT_PATH = os.path.join(assets.OUT_DIR, 'axioparse.duckdb')
+
+OTU_PARQUET_PATH = os.path.join(assets.OUT_DIR, 'otu_table.parquet')
+TAXONOMY_PARQUET_PATH = os.path.join(assets.OUT_DIR, 'taxonomy.parquet')
+METADATA_PARQUET_PATH = os.path.join(assets.OUT_DIR, 'metadata.parquet')
+
+
+def dictionary_encode_strings(df):
+    '''
+    Return a copy of df with every string column as a categorical, which parquet stores dictionary-encoded
+    '''
+    string_cols = df.select_dtypes(include="object").columns
+    return df.astype({col: "category" for col in string_cols})
+
+
+@instrumented_asset(group_name="write_data")
+def write_otu_parquet(delete_extra_samples):
+    '''
+    Step W.7: write the otu table to parquet with the species as a dictionary-encoded column and one uint8 presence
+    column per sample
+    '''
+    otu_table = delete_extra_samples.sort_species().to_frame()
+    otu_table = dictionary_encode_strings(otu_table.astype({sample: np.uint8 for sample in delete_extra_samples.samples}))
+    otu_table.to_parquet(OTU_PARQUET_PATH, index=False)
+
+
+@instrumented_asset(group_name="write_data")
+def write_taxonomy_parquet(remove_duplicate_species):
+    '''
+    Step W.8: write the taxonomy table to parquet with every rank as a dictionary-encoded column
+    '''
+    dictionary_encode_strings(remove_duplicate_species).to_parquet(TAXONOMY_PARQUET_PATH, index=False)
+
+
+@instrumented_asset(group_name="write_data")
+def write_metadata_parquet(read_metadata):
+    '''
+    Step W.9: write the metadata to parquet, keeping the column types pandas read it with
+    '''
+    dictionary_encode_strings(read_metadata).to_parquet(METADATA_PARQUET_PATH, index=False)
+
+
+@instrumented_asset(group_name="write_data", deps=[write_otu_parquet, write_taxonomy_parquet, write_metadata_parquet])
+def write_duckdb(duckdb: DuckDBResource):
+    '''
+    Step W.10: load the parquet exports into a duckdb database as the tables otu, taxonomy and metadata, with a
+    presence view holding one row per detected species and sample joined to its taxonomy and metadata
+    '''
+    with duckdb.get_connection() as conn:
+        conn.execute("CREATE OR REPLACE TABLE otu AS SELECT * FROM read_parquet(?)", [OTU_PARQUET_PATH])
+        conn.execute("CREATE OR REPLACE TABLE taxonomy AS SELECT * FROM read_parquet(?)", [TAXONOMY_PARQUET_PATH])
+        conn.execute("CREATE OR REPLACE TABLE metadata AS SELECT * FROM read_parquet(?)", [METADATA_PARQUET_PATH])
+        conn.execute('''
+            CREATE OR REPLACE VIEW presence AS
+            SELECT *
+            FROM (UNPIVOT otu ON COLUMNS(* EXCLUDE (Species)) INTO NAME sample_id VALUE present) AS long_otu
+            JOIN taxonomy USING (Species)
+            JOIN metadata USING (sample_id)
+            WHERE present = 1
+        ''')
@@ -0,0 +1,54 @@
+import os
+from dagster import Definitions, in_process_executor, load_assets_from_modules, mem_io_manager
+
+from . import assets, io_managers, partitions, sharded, streaming
+
+# setting this in the .env file adds the parquet and duckdb writers of the columnar module to the write_data group.
+# the module is only imported then, so other runs do not load duckdb
+COLUMNAR_EXPORT = os.getenv("AXIOPARSE_COLUMNAR_EXPORT", "").lower() in ("1", "true", "yes")
+
+all_assets = load_assets_from_modules([assets])
+all_sensors = []
+all_resources = {}
+
+# streaming mode swaps the in-memory otu cleaning assets for their streaming equivalents
+if streaming.OTU_CHUNKSIZE:
+    all_assets = [asset_def for asset_def in all_assets if asset_def.key.path[-1] not in streaming.REPLACED_ASSETS]
+    all_assets += load_assets_from_modules([streaming])
+
+# partitioned mode swaps them for one partition per array run, added by a sensor as new runs show up
+elif partitions.PARTITION_BY_RUN:
+    all_assets = [asset_def for asset_def in all_assets if asset_def.key.path[-1] not in partitions.REPLACED_ASSETS]
+    all_assets += load_assets_from_modules([partitions])
+    all_sensors.append(partitions.array_run_sensor)
+
+# sharded mode swaps the per-sample cleaning steps for one asset that spreads the samples over worker processes
+elif sharded.SAMPLE_WORKERS:
+    all_assets = [asset_def for asset_def in all_assets if asset_def.key.path[-1] not in sharded.REPLACED_ASSETS]
+    all_assets += load_assets_from_modules([sharded])
+
+# optional parquet and duckdb exports next to the text outputs
+if COLUMNAR_EXPORT:
+    from dagster_duckdb import DuckDBResource
+    from . import columnar
+
+    all_assets += load_assets_from_modules([columnar])
+    all_resources["duckdb"] = DuckDBResource(database=columnar.DUCKDB_OUT_PATH)
+
+# intermediates are stored as arrow files by default. memory hands them between the steps of a single in-process
+# run instead, which the assets allow because none of them modify their inputs
+executor = None
+if io_managers.IO_MANAGER == "arrow":
+    all_resources["io_manager"] = io_managers.arrow_io_manager
+elif io_managers.IO_MANAGER == "memory":
+    all_resources["io_manager"] = mem_io_manager
+    executor = in_process_executor
+elif io_managers.IO_MANAGER != "pickle":
+    raise ValueError(f"Unknown io manager {io_managers.IO_MANAGER!r} in AXIOPARSE_IO_MANAGER, expected arrow, memory or pickle")
+
+defs = Definitions(
+    assets=all_assets,
+    sensors=all_sensors,
+    resources=all_resources,
+    executor=executor,
+)
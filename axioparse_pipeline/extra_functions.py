@@ -1,47 +1,248 @@
 import pandas as pd
+import numpy as np
 from Bio import Entrez
-from dotenv import load_dotenv
+import collections
+import json
 import os
+import re
 import time
 import warnings
+from . import ncbi_client, taxdump, taxonomy_cache
 
-load_dotenv()
 Entrez.email = os.getenv("NCBI_EMAIL")
 Entrez.api_key = os.getenv("NCBI_KEY")
+EFETCH_BATCH_SIZE = int(os.getenv("AXIOPARSE_EFETCH_BATCH_SIZE", "100"))
+TAXDUMP_INDEX_DIR = os.getenv("AXIOPARSE_TAXDUMP_INDEX")
+
+_cache = None
+_client = None
+
+# per-lookup search statistics: seconds spent on each uncached search term and the depth of each fallback search
+_search_seconds = {}
+_fallback_depths = {}
+
+def get_ncbi_client():
+    '''
+    Return the shared taxonomy backend, creating it on first use. this is the rate-limited NCBI client, or the offline
+    taxdump index if AXIOPARSE_TAXDUMP_INDEX points at one
+    '''
+    global _client
+    if _client is None:
+        if TAXDUMP_INDEX_DIR:
+            _client = taxdump.TaxdumpIndex(TAXDUMP_INDEX_DIR)
+        else:
+            _client = ncbi_client.NCBIClient(email=Entrez.email, api_key=Entrez.api_key)
+    return _client
+
+def taxonomy_backend():
+    '''
+    Return the name of the taxonomy backend get_ncbi_client uses: "taxdump" for a local index, otherwise "ncbi"
+    '''
+    return "taxdump" if TAXDUMP_INDEX_DIR else "ncbi"
+
+def get_taxonomy_cache():
+    '''
+    Return the shared on-disk cache of NCBI lookups, opening it on first use
+    '''
+    global _cache
+    if _cache is None:
+        _cache = taxonomy_cache.TaxonomyCache()
+    return _cache
+
+def get_lookup_cache():
+    '''
+    Return the cache for search and lineage lookups, or None for the taxdump index. the index is read from memory and
+    needs no cache, and its results must not be served to later NCBI runs (or the other way round)
+    '''
+    return get_taxonomy_cache() if taxonomy_backend() == "ncbi" else None
 
 def validate_api():
     if not Entrez.email or not Entrez.api_key:
         raise EnvironmentError("NCBI_EMAIL and/or NCBI_KEY not found in environment variables. We strongly recommend using one before you continue.")
     else:
         print(f"Entrez email = {Entrez.email}")
-        print(f"Entrez api_key = {Entrez.api_key}")
+        print("Entrez api_key is set")
 
-def aggregate_row_to_binary(row):
-    num_samples = int((len(row)-1)/2)
-    for i in range(1, num_samples+1):
-        if not pd.isna(row.iloc[i]) or not pd.isna(row.iloc[i + num_samples]):
-            row.iloc[i] = 1
-        else:
-            row.iloc[i] = 0
+# ordered cell states of an otu table: missing < Secondary < DETECTED. missing cells are NaN in the categorical
+DETECTION_DTYPE = pd.CategoricalDtype(["Secondary", "DETECTED"], ordered=True)
+
+def encode_detection_states(otu_values):
+    '''
+    Encode a dataframe of otu table cells as a 2D array of int8 detection states (0 = missing, 1 = Secondary,
+    2 = DETECTED). Cells holding any other value are encoded as -1 so the caller can decide how to report them.
+    '''
+    # columns read in as DETECTION_DTYPE already hold the states as their categorical codes
+    if all(dtype == DETECTION_DTYPE for dtype in otu_values.dtypes):
+        states = np.empty(otu_values.shape, dtype=np.int8)
+        for j, col in enumerate(otu_values.columns):
+            states[:, j] = otu_values.iloc[:, j].cat.codes.to_numpy() + 1
+        return states
+
+    values = otu_values.to_numpy(dtype=object)
+    states = np.full(values.shape, -1, dtype=np.int8)
+    states[pd.isna(values)] = 0
+    states[values == "Secondary"] = 1
+    states[values == "DETECTED"] = 2
+    return states
+
+def decode_detection_states(states, columns):
+    '''
+    Inverse of encode_detection_states: build a dataframe of DETECTION_DTYPE columns from a 2D array of int8 states
+    '''
+    return pd.DataFrame({col: pd.Categorical.from_codes(states[:, j] - 1, dtype=DETECTION_DTYPE)
+                         for j, col in enumerate(columns)})
+
+# axiom array ids look like <chip>-<run>_<well>, e.g. a483920-2391847-070525-424_A01
+ARRAY_ID_PATTERN = re.compile(r'^(?P<chip>.+)-(?P<run>\d+)_(?P<well>[^_]+)$')
+
+def split_array_id(array_id):
+    '''
+    Split an axiom array id into the key shared by its DNA and RNA probes (chip and well) and its run id. Returns None
+    if the id does not follow the axiom naming scheme.
+    '''
+    match = ARRAY_ID_PATTERN.match(str(array_id))
+    if not match:
+        return None
+    return f"{match['chip']}_{match['well']}", match['run']
+
+def select_otu_columns(columns, metadata):
+    '''
+    Return the otu table columns needed for the samples in metadata: the DNA column of every sample (its array_id)
+    and every column sharing its chip and well, which holds the matching RNA probes
+    '''
+    array_ids = set(metadata['array_id'])
+    sample_keys = {parts[0] for parts in map(split_array_id, array_ids) if parts}
+    selected = []
+    for col in columns:
+        parts = split_array_id(col)
+        if col in array_ids or (parts and parts[0] in sample_keys):
+            selected.append(col)
+
+    return selected
+
+def list_array_runs(columns, metadata):
+    '''
+    Return the sorted run ids of the DNA plates of every sample in metadata that has a column in the otu table
+    '''
+    array_ids = set(metadata['array_id']).intersection(columns)
+    return sorted({parts[1] for parts in map(split_array_id, array_ids) if parts})
+
+def read_probe_species(path, species_cov):
+    '''
+    Read only the probe column of the otu table at path and merge the species column from species coverage onto it
+    '''
+    probes = pd.read_csv(path, sep='\t', usecols=["Target Description"])
+    probes.rename(columns={"Target Description": "Probe"}, inplace=True)
+    merged = probes.merge(species_cov[['Probe', 'Species']], on='Probe', how='left')
+
+    return merged[['Species', 'Probe']].sort_values(by=['Species', 'Probe'])
+
+def _otu_read_args(path, metadata):
+    '''
+    Return the sample columns of the otu table at path that metadata needs, and the read_csv arguments to load them
+    '''
+    header = pd.read_csv(path, sep='\t', nrows=0).columns
+    sample_cols = select_otu_columns(header, metadata)
+    return sample_cols, dict(sep='\t', usecols=["Target Description"] + sample_cols,
+                             dtype={col: "category" for col in sample_cols})
+
+def _as_detection_states(otu_table, sample_cols):
+    '''
+    Convert the categorical sample columns of a freshly read otu table to DETECTION_DTYPE, throwing an error if a
+    cell holds anything other than Secondary or DETECTED
+    '''
+    unexpected = {col: list(set(otu_table[col].cat.categories) - set(DETECTION_DTYPE.categories)) for col in sample_cols}
+    unexpected = {col: values for col, values in unexpected.items() if values}
+    if unexpected:
+        raise ValueError(f"The otu table contains unexpected values (column: values): {unexpected}")
+
+    otu_table[sample_cols] = otu_table[sample_cols].astype(DETECTION_DTYPE)
+    return otu_table
+
+def read_otu_table(path, metadata, engine="c"):
+    '''
+    Read the otu table columns needed for the samples in metadata, with sample cells as DETECTION_DTYPE
+    '''
+    sample_cols, read_args = _otu_read_args(path, metadata)
+    return _as_detection_states(pd.read_csv(path, engine=engine, **read_args), sample_cols)
+
+def iter_otu_table(path, metadata, chunksize):
+    '''
+    Like read_otu_table, but yield the table in dataframes of up to chunksize rows
+    '''
+    sample_cols, read_args = _otu_read_args(path, metadata)
+    with pd.read_csv(path, chunksize=chunksize, **read_args) as reader:
+        for chunk in reader:
+            yield _as_detection_states(chunk, sample_cols)
+
+def pair_dna_rna_columns(columns, metadata):
+    '''
+    Pair every sample column (already renamed to its sample_id) with the RNA column that shares its chip and well.
+    Returns a list of (sample_id, rna_column) tuples in column order and raises a ValueError if any sample does not
+    have exactly one RNA partner.
+    '''
+    array_ids = dict(zip(metadata['sample_id'], metadata['array_id']))
+    sample_cols = [col for col in columns if col in array_ids]
+
+    rna_candidates = {}
+    for col in columns:
+        parts = split_array_id(col)
+        if col not in array_ids and parts:
+            rna_candidates.setdefault(parts[0], []).append(col)
+
+    pairs = []
+    unpaired = []
+    for sample_id in sample_cols:
+        parts = split_array_id(array_ids[sample_id])
+        partners = rna_candidates.get(parts[0], []) if parts else []
+        if len(partners) != 1:
+            unpaired.append(f"{sample_id} ({array_ids[sample_id]}): {partners}")
+            continue
+        pairs.append((sample_id, partners[0]))
+
+    if unpaired:
+        raise ValueError(f"Could not pair DNA and RNA columns for the following samples (sample_id (array_id): RNA matches):\n{unpaired}")
+
+    return pairs
 
-    return row
+def reset_search_stats():
+    _search_seconds.clear()
+    _fallback_depths.clear()
+
+def search_stats(slowest=10):
+    '''
+    Return the fallback searches (as the number of probes per fallback depth) and the slowest uncached search terms
+    since reset_search_stats as metadata entries
+    '''
+    slowest_terms = sorted(_search_seconds.items(), key=lambda item: item[1], reverse=True)[:slowest]
+    depth_counts = collections.Counter(_fallback_depths.values())
+    return {"ncbi_fallback_searches": len(_fallback_depths),
+            "ncbi_fallback_max_depth": max(_fallback_depths.values(), default=0),
+            "ncbi_fallback_depths": {str(depth): depth_counts[depth] for depth in sorted(depth_counts)},
+            "ncbi_slowest_searches_s": {term: round(seconds, 3) for term, seconds in slowest_terms}}
 
 def search_ncbi_taxonomy(term):
+    cache = get_lookup_cache()
+    cached_ids = cache.get_search(term) if cache is not None else None
+    if cached_ids is not None:
+        return cached_ids
+
+    start = time.perf_counter()
     try:
-        handle = Entrez.esearch(db="taxonomy", term=term)
-        record = Entrez.read(handle)
-        handle.close()
-        time.sleep(0.1)
-        return record['IdList']
-    except:
+        id_list = get_ncbi_client().esearch(term)
+    except Exception as e:
+        warnings.warn(f"Taxonomy search for {term!r} failed: {e}")
         return []
+    finally:
+        _search_seconds[term] = time.perf_counter() - start
+
+    if cache is not None:
+        cache.put_search(term, id_list)
+    return id_list
 
 def select_best_tax_id(tax_id_list, search_name):
 
-    handle = Entrez.efetch(db="taxonomy", id=",".join(tax_id_list))
-    records = Entrez.read(handle)
-    handle.close()
-    time.sleep(0.1)
+    records = get_ncbi_client().efetch(tax_id_list)
 
     for record in records:
         if record.get('ScientificName', '').lower() == search_name.lower():
@@ -49,21 +250,137 @@ def select_best_tax_id(tax_id_list, search_name):
 
     return tax_id_list[0]
 
-def fetch_taxonomy_data(tax_id, original_species, retry):
-    for attempt_num in range(retry):
-        try:
-            handle = Entrez.efetch(db="taxonomy", id=tax_id)
-            record = Entrez.read(handle)
-            handle.close()
-            time.sleep(0.1)
-            return record[0] if record else None
-        except Exception as e:
-            time.sleep(0.1 * (attempt_num + 1))
-            warnings.warn(f"Attempt {attempt_num + 1} of {retry} failed for original species {original_species} and tax id {tax_id}: {e}")
-
-    warnings.warn(f"All {retry} attempts failed for original species {original_species} and tax id {tax_id}")
-    return None
-            
+def fetch_taxonomy_chunk(tax_ids):
+    '''
+    Fetch the taxonomy records of one chunk of tax ids with a single efetch call. The NCBI client already retries
+    throttled and failed requests, so a chunk that still fails is split in half rather than tried again, so that a
+    single bad id does not sink the rest of its chunk.
+    '''
+    try:
+        return list(get_ncbi_client().efetch(tax_ids))
+    except Exception as e:
+        warnings.warn(f"Failed to fetch tax ids {tax_ids}: {e}")
+
+    if len(tax_ids) == 1:
+        return []
+
+    half = len(tax_ids) // 2
+    return fetch_taxonomy_chunk(tax_ids[:half]) + fetch_taxonomy_chunk(tax_ids[half:])
+
+def fetch_taxonomy_batch(tax_ids, batch_size=EFETCH_BATCH_SIZE):
+    '''
+    Fetch the taxonomy records of many tax ids with one efetch call per chunk of batch_size ids, running the chunks
+    concurrently on the NCBI client. Returns a dict of tax id -> record; ids that cannot be fetched are left out.
+    '''
+    cache = get_lookup_cache()
+    records = {}
+    uncached = []
+    for tax_id in dict.fromkeys(str(tid).strip() for tid in tax_ids):
+        cached_record = cache.get_lineage(tax_id) if cache is not None else None
+        if cached_record is not None:
+            records[tax_id] = cached_record
+        else:
+            uncached.append(tax_id)
+
+    chunks = [uncached[start:start + batch_size] for start in range(0, len(uncached), batch_size)]
+    fetched_chunks = get_ncbi_client().map(fetch_taxonomy_chunk, chunks) if chunks else []
+
+    # store as plain json so cached and fresh records look the same to callers. merged tax ids come back under
+    # their current TaxId with the requested id listed in AkaTaxIds
+    requested = set(uncached)
+    for fetched in fetched_chunks:
+        for record in fetched:
+            taxonomy_info = json.loads(json.dumps(record))
+            for tax_id in [taxonomy_info.get('TaxId')] + taxonomy_info.get('AkaTaxIds', []):
+                if tax_id in requested:
+                    records[tax_id] = taxonomy_info
+                    if cache is not None:
+                        cache.put_lineage(tax_id, taxonomy_info)
+
+    return records
+
+def fetch_taxonomy_data(tax_id, original_species):
+    taxonomy_info = fetch_taxonomy_batch([tax_id], batch_size=1).get(str(tax_id).strip())
+    if taxonomy_info is None:
+        warnings.warn(f"Could not fetch taxonomy for original species {original_species} and tax id {tax_id}")
+
+    return taxonomy_info
+
+def resolve_taxonomy(tax_table, species_cov):
+    '''
+    Resolve the lineage of every species in tax_table (which needs Domain and Species columns). Species without a
+    usable search result fall back to a search on their first probe name in species_cov. Returns a list of lineage
+    dicts and a list of the species that could not be resolved.
+    '''
+    failed_species = []
+    taxonomy_rows = []
+    client = get_ncbi_client()
+
+    # first probe of every species, for the fallback search
+    first_probe_rows = species_cov.drop_duplicates(subset=['Species'])
+    first_probes = dict(zip(first_probe_rows['Species'], first_probe_rows['Probe']))
+
+    # phase 1: resolve every species to a tax id. searches run concurrently on the taxonomy backend
+    original_species_list = tax_table['Species'].tolist()
+    search_results = client.map(search_ncbi_taxonomy, original_species_list)
+    tax_id_lists = {species: [tid for tid in tax_id_list if tid.strip().isdigit()]
+                    for species, tax_id_list in zip(original_species_list, search_results)}
+
+    # attempt fallback search using probe name if tax_id_list is empty or too long
+    fallback_probes = {}
+    for original_species, tax_id_list in tax_id_lists.items():
+        if (not tax_id_list) or (len(tax_id_list) > 5):
+            fallback_probes[original_species] = first_probes[original_species]
+            print(f"using fallback search for Original Species: {original_species} and Probe: {fallback_probes[original_species]}")
+
+    fallback_results = client.map(fallback_search, fallback_probes.values())
+    for original_species, tax_id_list in zip(fallback_probes, fallback_results):
+        tax_id_lists[original_species] = [tid for tid in tax_id_list if tid.strip().isdigit()]
+
+    best_tax_ids = {}
+    for original_species, tax_id_list in tax_id_lists.items():
+        # if original and fallback searches failed, append to failed list
+        if not tax_id_list:
+            warnings.warn(f"skipping rest of loop because {original_species} failed search at checkpoint 1")
+            failed_species.append(original_species)
+            continue
+
+        # take the first match
+        best_tax_ids[original_species] = tax_id_list[0].strip()
+
+    # phase 2: collect the taxonomy data for all tax ids in batched efetch calls
+    taxonomy_records = fetch_taxonomy_batch(best_tax_ids.values())
+
+    # phase 3: map the lineages back onto the original species. if a fetch failed, append to failed list
+    for _, row in tax_table.iterrows():
+        original_species = row['Species']
+        if original_species not in best_tax_ids:
+            continue
+
+        taxonomy_info = taxonomy_records.get(best_tax_ids[original_species])
+        if not taxonomy_info:
+            warnings.warn(f"skipping rest of loop because {original_species} failed search at checkpoint 2. returned taxonomy info is {taxonomy_info}")
+            failed_species.append(original_species)
+            continue
+
+        # grab domain from species coverage spreadsheet because NCBI doesn't have it
+        domain = re.sub(r'(_noFamily|Families)$', '', row["Domain"])
+
+        # extract lineage info into a dictionary, add that to taxonomy_rows
+        lineage = {d['Rank']: d['ScientificName'] for d in taxonomy_info.get('LineageEx', [])}
+        lineage.update({'Domain': str(domain),
+                        'Kingdom': str(lineage.get('kingdom', '')),
+                        'Phylum': str(lineage.get('phylum', '')),
+                        'Class': str(lineage.get('class', '')),
+                        'Order': str(lineage.get('order', '')),
+                        'Family': str(lineage.get('family', '')),
+                        'Genus': str(lineage.get('genus', '')),
+                        'Species': str(taxonomy_info.get('ScientificName', '')),
+                        'Original Species': str(original_species)
+        })
+        taxonomy_rows.append(lineage)
+
+    return taxonomy_rows, failed_species
 
 def fallback_search(probe_name):
     if probe_name.endswith(", combined chrs"):
@@ -71,11 +388,14 @@ def fallback_search(probe_name):
 
     ids = search_ncbi_taxonomy(probe_name)
 
-    if not ids:
-        query_parts = probe_name.split()
-        while query_parts and not ids:
-            probe_query = " ".join(query_parts)
-            ids = search_ncbi_taxonomy(probe_query)
-            query_parts = query_parts[:-1]
+    # depth is the number of words dropped from the end of the probe name before a search matched, or all of its words
+    # if none did
+    query_parts = probe_name.split()
+    depth = 0
+    while not ids and depth < len(query_parts):
+        depth += 1
+        if depth < len(query_parts):
+            ids = search_ncbi_taxonomy(" ".join(query_parts[:-depth]))
+    _fallback_depths[probe_name] = depth
     
     return ids
@@ -0,0 +1,159 @@
+from dagster import (asset, AssetCheckKey, AssetCheckResult, AssetCheckSeverity, AssetCheckSpec, AssetExecutionContext,
+                     DagsterInvariantViolationError, Output)
+import functools
+import inspect
+import os
+import sys
+import time
+import pandas as pd
+from .otu_matrix import OtuMatrix
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+# a materialization that is this much slower or bigger than the previous one fails its performance check (as a warning)
+REGRESSION_THRESHOLD = float(os.getenv("AXIOPARSE_REGRESSION_THRESHOLD", "0.5"))
+NCBI_P95_BUDGET_MS = float(os.getenv("AXIOPARSE_NCBI_P95_BUDGET_MS", "2000"))
+
+# differences below these are noise, whatever the threshold says
+NOISE_FLOOR = {"wall_time_s": 0.5, "peak_rss_delta_mb": 50.0}
+
+
+def peak_rss_mb():
+    '''
+    Return the peak resident set size of this process so far in MB, or None where the resource module is missing
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def describe(value, prefix=""):
+    '''
+    Return the row count, column count and memory usage of a dataframe or OtuMatrix as metadata entries, or nothing for
+    any other value
+    '''
+    if isinstance(value, pd.DataFrame):
+        memory = value.memory_usage(deep=True).sum()
+        return {f"{prefix}rows": len(value), f"{prefix}columns": len(value.columns),
+                f"{prefix}memory_mb": round(float(memory) / 2**20, 3)}
+    if isinstance(value, OtuMatrix):
+        memory = value.values.data.nbytes + value.values.indices.nbytes + value.values.indptr.nbytes
+        return {f"{prefix}rows": value.shape[0], f"{prefix}columns": value.shape[1],
+                f"{prefix}detections": value.values.nnz, f"{prefix}memory_mb": round(float(memory) / 2**20, 3)}
+    return {}
+
+
+def instrument(function, checks=()):
+    '''
+    Wrap an asset function so that every materialization records its wall time, the growth of the process's peak RSS
+    and the shape and memory usage of its inputs and output as output metadata. Each of checks is called with the
+    context and the finished output metadata and returns the AssetCheckResult of the check of that name, so the checks
+    run in the asset's own step. Outside of a run (e.g. when an asset is invoked directly in a test) the function just
+    runs, and its checks are reported as skipped.
+    '''
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        wall_time = time.perf_counter() - start
+        rss_after = peak_rss_mb()
+
+        try:
+            context = AssetExecutionContext.get()
+        except DagsterInvariantViolationError:
+            if not checks:
+                return result
+            return _events(result, [AssetCheckResult(check_name=check.__name__, passed=True,
+                                                     metadata={"note": "not evaluated outside of a run"})
+                                    for check in checks])
+
+        metadata = {"wall_time_s": round(wall_time, 4)}
+        if rss_before is not None:
+            metadata["peak_rss_delta_mb"] = round(rss_after - rss_before, 2)
+        for name, value in signature.bind(*args, **kwargs).arguments.items():
+            metadata.update(describe(value, prefix=f"input_{name}_"))
+        metadata.update(describe(result))
+        output_name = context.assets_def.get_output_name_for_asset_key(context.asset_key)
+        context.add_output_metadata(metadata, output_name=output_name)
+
+        if not checks:
+            return result
+        output_metadata = context.get_output_metadata(output_name)
+        return _events(result, [check(context, output_metadata) for check in checks
+                                if AssetCheckKey(context.asset_key, check.__name__) in context.selected_asset_check_keys])
+
+    return wrapper
+
+
+def _events(value, check_results):
+    yield Output(value)
+    yield from check_results
+
+
+def instrumented_asset(checks=(), **asset_kwargs):
+    '''
+    Decorator for an instrumented asset: @asset(**asset_kwargs) over instrument(function). Unpartitioned assets get a
+    performance_regression check, and checks adds more (see instrument). The checks are declared as check specs of the
+    asset, so they need no steps of their own.
+    '''
+    def decorator(function):
+        asset_checks = list(checks) if asset_kwargs.get("partitions_def") else [performance_regression, *checks]
+        check_specs = [AssetCheckSpec(check.__name__, asset=asset_kwargs.get("name", function.__name__),
+                                      description=check.__doc__.strip()) for check in asset_checks]
+        return asset(check_specs=check_specs, **asset_kwargs)(instrument(function, asset_checks))
+
+    return decorator
+
+
+def latest_metadata(instance, asset_key, limit=2):
+    '''
+    Return the metadata of the latest materializations of asset_key, newest first, as plain values
+    '''
+    records = instance.fetch_materializations(asset_key, limit=limit).records
+    return [{key: value.value for key, value in record.asset_materialization.metadata.items()} for record in records]
+
+
+def performance_regression(context, metadata):
+    '''
+    Wall time and peak RSS growth compared with the previous materialization
+    '''
+    # the materialization being checked is not stored yet, so the latest stored one is the previous materialization
+    history = latest_metadata(context.instance, context.asset_key, limit=1)
+    if not history:
+        return AssetCheckResult(check_name="performance_regression", passed=True,
+                                metadata={"note": "no previous materialization to compare with"})
+
+    previous = history[0]
+    regressions = {}
+    for metric, floor in NOISE_FLOOR.items():
+        if metadata.get(metric) is None or previous.get(metric) is None:
+            continue
+        if metadata[metric] > previous[metric] * (1 + REGRESSION_THRESHOLD) and metadata[metric] - previous[metric] > floor:
+            regressions[metric] = f"{previous[metric]} -> {metadata[metric]}"
+
+    return AssetCheckResult(check_name="performance_regression", passed=not regressions,
+                            severity=AssetCheckSeverity.WARN,
+                            metadata={**{f"previous_{metric}": previous.get(metric) for metric in NOISE_FLOOR},
+                                      **{f"current_{metric}": metadata.get(metric) for metric in NOISE_FLOOR},
+                                      **regressions})
+
+
+def ncbi_requests_healthy(context, metadata):
+    '''
+    NCBI requests were not retried and p95 latency is in budget
+    '''
+    retries = metadata.get("ncbi_retries", 0)
+    p95 = metadata.get("ncbi_latency_p95_ms", 0)
+
+    return AssetCheckResult(check_name="ncbi_requests_healthy", passed=not retries and p95 <= NCBI_P95_BUDGET_MS,
+                            severity=AssetCheckSeverity.WARN,
+                            metadata={"ncbi_retries": retries, "ncbi_latency_p95_ms": p95,
+                                      "ncbi_p95_budget_ms": NCBI_P95_BUDGET_MS})
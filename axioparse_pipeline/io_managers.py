@@ -0,0 +1,54 @@
+from dagster import io_manager, Field, StringSource, UPathIOManager
+import os
+import pickle
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from upath import UPath
+
+# arrow (the default) stores intermediates as arrow files on disk; memory keeps them in process, see definitions.py
+IO_MANAGER = os.getenv("AXIOPARSE_IO_MANAGER", "arrow").lower()
+
+ARROW_MAGIC = b"ARROW1"
+
+
+class ArrowIOManager(UPathIOManager):
+    '''
+    Stores dataframes as uncompressed arrow IPC (feather v2) files, which are memory-mapped on load so numeric and
+    categorical columns are read without a copy. Everything else (the sparse otu matrix, None) and dataframes arrow
+    cannot represent are pickled into the same file; load_from_path tells the two apart by the arrow magic bytes.
+    '''
+
+    extension = ".arrow"
+
+    def __init__(self, base_dir):
+        super().__init__(base_path=UPath(base_dir))
+
+    def dump_to_path(self, context, obj, path):
+        if isinstance(obj, pd.DataFrame):
+            try:
+                feather.write_feather(obj, str(path), compression="uncompressed")
+                return
+            except (pa.ArrowException, ValueError) as e:
+                context.log.warning(f"Could not store {context.asset_key.to_user_string()} as arrow, pickling it: {e}")
+
+        with path.open("wb") as out_file:
+            pickle.dump(obj, out_file, pickle.HIGHEST_PROTOCOL)
+
+    def load_from_path(self, context, path):
+        with path.open("rb") as in_file:
+            is_arrow = in_file.read(len(ARROW_MAGIC)) == ARROW_MAGIC
+            if not is_arrow:
+                in_file.seek(0)
+                return pickle.load(in_file)
+
+        return feather.read_table(str(path), memory_map=True).to_pandas(split_blocks=True)
+
+
+@io_manager(config_schema={"base_dir": Field(StringSource, is_required=False)})
+def arrow_io_manager(init_context):
+    '''
+    IO manager that stores asset outputs with ArrowIOManager under base_dir, by default the dagster storage directory
+    '''
+    base_dir = init_context.resource_config.get("base_dir", init_context.instance.storage_directory())
+    return ArrowIOManager(base_dir)
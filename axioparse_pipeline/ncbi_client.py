@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+import numpy as np
+from Bio import Entrez
+
+# client settings can be overridden in the .env file next to NCBI_EMAIL and NCBI_KEY
+EUTILS_URL = os.getenv("NCBI_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+NCBI_WORKERS = int(os.getenv("AXIOPARSE_NCBI_WORKERS", "4"))
+
+# NCBI allows 3 requests per second without an API key and 10 with one
+RATE_WITHOUT_KEY = 3
+RATE_WITH_KEY = 10
+
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket: acquire() blocks until a token is available. Tokens refill at rate per second up to
+    capacity, so capacity=1 spaces requests evenly and never bursts above the rate.
+    '''
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_after_seconds(value):
+    '''
+    Return the delay of a Retry-After header given in seconds, or None if it is missing or in another form (such as
+    an HTTP date), in which case the caller falls back to its own backoff
+    '''
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class NCBIClient:
+    '''
+    Rate-limited E-utilities client shared by the taxonomy helpers. Requests go through a token bucket tuned to NCBI's
+    limits, are retried with exponential backoff on HTTP 429/5xx and network errors, and can be fanned out over a
+    thread pool with map(). Responses are parsed with Entrez.read, so callers see the same records as with Bio.Entrez.
+    close() (or leaving a with block) shuts the thread pool down; the next map() starts a new one.
+    '''
+
+    def __init__(self, email=None, api_key=None, base_url=EUTILS_URL, rate=None, max_workers=NCBI_WORKERS,
+                 retry=3, backoff=0.5, timeout=30):
+        self.email = email
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(rate or (RATE_WITH_KEY if api_key else RATE_WITHOUT_KEY))
+        self.max_workers = max_workers
+        self.executor = None
+        self.retry = retry
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.retries = 0
+
+    def request(self, utility, **params):
+        '''
+        POST a request to an E-utility (e.g. "esearch") and return the parsed record
+        '''
+        params.update({"tool": "axioparse", "email": self.email, "api_key": self.api_key})
+        data = urlencode({key: value for key, value in params.items() if value is not None}).encode()
+
+        for attempt_num in range(self.retry + 1):
+            self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                with urlopen(Request(f"{self.base_url}/{utility}.fcgi", data=data), timeout=self.timeout) as handle:
+                    record = Entrez.read(handle)
+                self._record_latency(start)
+                return record
+            except HTTPError as e:
+                self._record_latency(start)
+                # other 4xx errors mean the request itself is bad, so retrying will not help
+                if (e.code != 429 and e.code < 500) or attempt_num == self.retry:
+                    raise
+                delay = retry_after_seconds(e.headers.get("Retry-After"))
+                if delay is None:
+                    delay = self.backoff * 2 ** attempt_num
+            # network errors, including connections dropped while the response is read, which urllib does not wrap
+            except (HTTPException, OSError):
+                self._record_latency(start)
+                if attempt_num == self.retry:
+                    raise
+                delay = self.backoff * 2 ** attempt_num
+
+            with self.lock:
+                self.retries += 1
+            time.sleep(delay)
+
+    def esearch(self, term):
+        return list(self.request("esearch", db="taxonomy", term=term)['IdList'])
+
+    def efetch(self, tax_ids):
+        return self.request("efetch", db="taxonomy", id=",".join(tax_ids))
+
+    def map(self, function, items):
+        '''
+        Apply function to every item on the client's thread pool and return the results in order
+        '''
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ncbi")
+            executor = self.executor
+        return list(executor.map(function, items))
+
+    def close(self):
+        '''
+        Shut down the thread pool, waiting for running requests to finish
+        '''
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _record_latency(self, start):
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+
+    def reset_stats(self):
+        with self.lock:
+            self.latencies = []
+            self.retries = 0
+
+    def stats(self):
+        with self.lock:
+            latencies_ms = np.array(self.latencies) * 1000
+            retries = self.retries
+        return {"ncbi_requests": len(latencies_ms),
+                "ncbi_retries": retries,
+                "ncbi_latency_p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else 0.0,
+                "ncbi_latency_p95_ms": float(np.percentile(latencies_ms, 95)) if len(latencies_ms) else 0.0}
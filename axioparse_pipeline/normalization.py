@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# characters qiime2 cannot handle in feature ids are first marked with * (spaces become _), see sanitize_otu_id
+OTU_ID_MARKS = str.maketrans({" ": "_", "(": "*", ")": "*", "[": "*", "]": "*", ":": "*"})
+
+TAX_RANK_PREFIXES = [("Domain", "d_"), ("Kingdom", "k_"), ("Phylum", "p_"), ("Class", "c_"), ("Order", "o_"),
+                     ("Family", "f_"), ("Genus", "g_"), ("Species", "s_")]
+
+
+def map_unique(values, function):
+    '''
+    Apply function once to every unique value of values (a categorical uses its categories) and broadcast the results
+    back to every position through the codes. Missing values stay missing. Returns an object array.
+    '''
+    values = pd.Series(values, copy=False)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+
+    # code -1 (missing) picks up the trailing nan
+    mapped = np.array([function(value) for value in uniques] + [np.nan], dtype=object)
+    return mapped[codes]
+
+
+def map_species(values, mapping):
+    '''
+    Map every species in values through the mapping dict, looking each distinct name up once. Names missing from the
+    mapping become None.
+    '''
+    return map_unique(values, mapping.get)
+
+
+def sanitize_otu_id(name):
+    '''
+    Make a species name safe to use as a qiime2 feature id: brackets and colons become spaces (a bracket followed by a
+    space becomes one space) and leading and trailing spaces are stripped
+    '''
+    return name.translate(OTU_ID_MARKS).replace("*_", "_").replace("*", "_").strip("_").replace("_", " ")
+
+
+def sanitize_otu_ids(species):
+    '''
+    Sanitize every species name with sanitize_otu_id, once per distinct name. Raises a ValueError if two distinct names
+    end up with the same id, since qiime2 would then treat them as one feature.
+    '''
+    sanitized = map_unique(species, sanitize_otu_id)
+
+    names = pd.DataFrame({"species": species, "otu_id": sanitized}).drop_duplicates()
+    collisions = names[names.duplicated(subset="otu_id", keep=False)]
+    if not collisions.empty:
+        collided = collisions.groupby("otu_id")["species"].apply(sorted).to_dict()
+        raise ValueError(f"The following species names collapse to the same id when sanitized for QIIME2 (id: species): {collided}")
+
+    return sanitized
+
+
+def taxonomy_strings(tax_table):
+    '''
+    Build the d_...; k_...; ...; s_... taxonomy string of every row of tax_table by concatenating whole columns
+    '''
+    taxonomy = None
+    for column, prefix in TAX_RANK_PREFIXES:
+        ranks = prefix + tax_table[column].astype(str)
+        taxonomy = ranks if taxonomy is None else taxonomy + "; " + ranks
+    return taxonomy
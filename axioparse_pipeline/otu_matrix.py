@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from . import extra_functions
+
+
+class OtuMatrix:
+    '''
+    Sparse otu table: a CSR matrix with one row per species and one column per sample, plus the species and sample
+    labels of its rows and columns. Cells hold int8 detection states (see extra_functions.encode_detection_states)
+    until combine_dna_rna_probes, and uint8 presence after it. Only detections are stored, so memory grows with the
+    number of calls rather than with probes x samples.
+    '''
+
+    def __init__(self, values, species, samples):
+        self.values = sparse.csr_matrix(values)
+        self.species = np.asarray(species, dtype=object)
+        self.samples = np.asarray(samples, dtype=object)
+        if self.values.shape != (len(self.species), len(self.samples)):
+            raise ValueError(f"OtuMatrix values have shape {self.values.shape} but there are {len(self.species)} "
+                             f"species and {len(self.samples)} samples")
+
+    @classmethod
+    def from_frame(cls, otu_table, species_col="Species"):
+        '''
+        Build a matrix of detection states from an otu table with a species column and one column of detection calls
+        per sample. Cells holding any other value are stored as -1, as encode_detection_states does. The table is
+        encoded one column at a time so no dense copy of it is made.
+        '''
+        sample_cols = [col for col in otu_table.columns if col != species_col]
+        rows, cols, data = [], [], []
+        for j, col in enumerate(sample_cols):
+            states = extra_functions.encode_detection_states(otu_table[[col]])[:, 0]
+            nonzero = np.flatnonzero(states)
+            rows.append(nonzero)
+            cols.append(np.full(len(nonzero), j))
+            data.append(states[nonzero])
+
+        values = sparse.coo_matrix((np.concatenate(data or [np.zeros(0, np.int8)]),
+                                    (np.concatenate(rows or [np.zeros(0, int)]), np.concatenate(cols or [np.zeros(0, int)]))),
+                                   shape=(len(otu_table), len(sample_cols)), dtype=np.int8)
+        return cls(values, otu_table[species_col].to_numpy(), sample_cols)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def check_condensed(self):
+        '''
+        Throw an error naming the first cell that is not empty, Secondary or DETECTED, i.e. that
+        encode_detection_states stored as -1
+        '''
+        values = self.values.tocoo()
+        if (values.data < 0).any():
+            bad = np.flatnonzero(values.data < 0)
+            i, j = min(zip(values.row[bad], values.col[bad]))
+            raise ValueError(f"ERROR: Lines not condensed at row {i} and column {j + 1}")
+
+    def group_max(self, labels=None):
+        '''
+        Combine the rows sharing a label (by default the species) into one row holding the highest value of each
+        sample, sorted by label. Rows without a label are dropped, as groupby does.
+        '''
+        labels = self.species if labels is None else np.asarray(labels, dtype=object)
+        codes, groups = pd.factorize(labels, sort=True)
+        values = group_max_codes(self.values, codes, len(groups))
+
+        return OtuMatrix(values, np.asarray(groups, dtype=object), self.samples)
+
+    def select_samples(self, samples):
+        '''
+        Return a matrix with only the given sample columns, in the given order
+        '''
+        positions = pd.Index(self.samples).get_indexer(samples)
+        if (positions < 0).any():
+            missing = [sample for sample, position in zip(samples, positions) if position < 0]
+            raise ValueError(f"The following samples are not in the otu matrix: {missing}")
+        return OtuMatrix(self.values[:, positions], self.species, samples)
+
+    def reindex_species(self, species):
+        '''
+        Return a matrix with one row per entry of species, empty for species that are not in this matrix. Every
+        species of this matrix must be listed.
+        '''
+        positions = pd.Index(species).get_indexer(self.species)
+        if (positions < 0).any():
+            raise ValueError(f"The following species are missing from the new index: {self.species[positions < 0].tolist()}")
+        values = self.values.tocoo()
+        values = sparse.coo_matrix((values.data, (positions[values.row], values.col)),
+                                   shape=(len(species), len(self.samples)))
+        return OtuMatrix(values, species, self.samples)
+
+    def sort_species(self):
+        '''
+        Return the matrix with its rows sorted by species
+        '''
+        order = np.argsort(self.species, kind="stable")
+        return OtuMatrix(self.values[order], self.species[order], self.samples)
+
+    def to_frame(self, species_col="Species"):
+        '''
+        Return the matrix as a dense dataframe with the species in the first column
+        '''
+        otu_table = pd.DataFrame(self.values.toarray(), columns=self.samples)
+        otu_table.insert(0, species_col, self.species)
+        return otu_table
+
+
+def group_max_codes(values, codes, n_groups):
+    '''
+    Combine the rows of the sparse matrix values into n_groups rows holding the highest value of each column, where
+    codes gives the group of every row (-1 drops the row). Returns a CSR matrix.
+    '''
+    keep = np.flatnonzero(codes >= 0)
+    membership = sparse.csr_matrix((np.ones(len(keep), dtype=np.int32), (codes[keep], keep)),
+                                   shape=(n_groups, len(codes)))
+
+    # the max of small non-negative integers is the number of levels 1..k that any row of the group reaches
+    grouped = sparse.csr_matrix((n_groups, values.shape[1]), dtype=values.dtype)
+    for level in np.unique(values.data[values.data > 0]):
+        reached = membership @ (values >= level).astype(np.int32)
+        grouped = grouped + (reached > 0).astype(values.dtype)
+
+    return grouped
+
+
+def hstack(matrices):
+    '''
+    Join matrices that hold different samples side by side. Their rows are aligned on the sorted union of species and
+    species missing from a matrix are left empty there.
+    '''
+    species = np.asarray(sorted(set().union(*(matrix.species for matrix in matrices))), dtype=object)
+    aligned = [matrix.reindex_species(species) for matrix in matrices]
+    values = sparse.hstack([matrix.values for matrix in aligned], format="csr")
+    return OtuMatrix(values, species, np.concatenate([matrix.samples for matrix in aligned]))
@@ -0,0 +1,108 @@
+from dagster import (sensor, AssetExecutionContext, AutomationCondition, DynamicPartitionsDefinition,
+                     ExperimentalWarning, RunRequest, SensorEvaluationContext, SensorResult)
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from . import assets, extra_functions, normalization, otu_matrix, streaming
+from .otu_matrix import OtuMatrix
+from .instrumentation import instrumented_asset
+# loaded as one of this module's assets: run_presence only reads the sample columns
+from .streaming import merge_samples_to_otu
+
+# setting this in the .env file switches the clean_otu_table group to one partition per array run
+PARTITION_BY_RUN = os.getenv("AXIOPARSE_PARTITION_BY_RUN", "").lower() in ("1", "true", "yes")
+
+# the partitioned assets replace the same in-memory assets as the streaming ones, and share their merge_samples_to_otu
+REPLACED_ASSETS = streaming.REPLACED_ASSETS
+
+# one partition per run id of the DNA plates, e.g. 424 for a483920-2391847-070525-424_A01. the RNA column of each
+# sample lives on another plate but stays in the partition of its DNA column
+array_runs = DynamicPartitionsDefinition(name="array_run")
+
+
+def run_metadata(metadata, run_id):
+    '''
+    Return the metadata rows of the samples whose DNA plate belongs to run_id
+    '''
+    runs = metadata['array_id'].map(lambda array_id: (extra_functions.split_array_id(array_id) or (None, None))[1])
+    return metadata[runs == run_id]
+
+
+@sensor(asset_selection=["run_presence"], minimum_interval_seconds=60)
+def array_run_sensor(context: SensorEvaluationContext):
+    '''
+    Add a partition for every array run that appears in the otu table and metadata, and materialize the new ones
+    '''
+    metadata = pd.read_csv(assets.METADATA_IN_PATH)
+    header = pd.read_csv(assets.OTU_IN_PATH, sep='\t', nrows=0).columns
+    new_runs = [run_id for run_id in extra_functions.list_array_runs(header, metadata)
+                if not context.instance.has_dynamic_partition(array_runs.name, run_id)]
+
+    return SensorResult(run_requests=[RunRequest(partition_key=run_id) for run_id in new_runs],
+                        dynamic_partitions_requests=[array_runs.build_add_request(new_runs)])
+
+
+@instrumented_asset(group_name="clean_otu_table", partitions_def=array_runs)
+def run_presence(context: AssetExecutionContext, read_metadata, read_species_coverage):
+    '''
+    Steps R.2 and O.1 to O.5 for one array run: read the columns of the run's samples, map probes to their original
+    species and combine dna and rna probes into one binary presence row per original species
+    '''
+    metadata = run_metadata(read_metadata, context.partition_key)
+    id_mapping = dict(zip(metadata['array_id'], metadata['sample_id']))
+
+    otu_table = extra_functions.read_otu_table(assets.OTU_IN_PATH, metadata, engine=assets.CSV_ENGINE)
+    otu_table = otu_table.rename(columns={"Target Description": "Probe", **id_mapping})
+    otu_table = otu_table.merge(read_species_coverage[['Probe', 'Species']], on='Probe', how='left')
+
+    # throw error if a probe is missing from species coverage
+    if otu_table["Species"].isnull().any():
+        unmatched = otu_table.loc[otu_table['Species'].isnull(), "Probe"].tolist()
+        raise ValueError(f"The following probes could not be matched to a species in run_presence: {unmatched}")
+
+    pairs = extra_functions.pair_dna_rna_columns(otu_table.columns, metadata)
+    dna_cols = [dna for dna, _ in pairs]
+    rna_cols = [rna for _, rna in pairs]
+    present = np.logical_or(otu_table[dna_cols].notna().to_numpy(), otu_table[rna_cols].notna().to_numpy())
+
+    return OtuMatrix(present.astype(np.uint8), otu_table['Species'].to_numpy(), dna_cols).group_max()
+
+
+def delete_extra_samples(read_metadata, enrich_taxonomy_table, run_presence):
+    '''
+    Steps O.3 to O.6 (partitioned): merge the presence tables of all array runs, replace species names using updated
+    taxonomy information and combine rows that now share a species. keeps only the samples that have metadata, in the
+    column order of the otu table. enrich_taxonomy_table is not partitioned: every run holds all probes of the array,
+    so a new run never brings new species, and the taxonomy of the array is resolved once and then served from the
+    cache (or manifest)
+    '''
+    # the io manager hands over a single partition as is and several as a dict of run id -> presence matrix
+    if isinstance(run_presence, OtuMatrix):
+        run_presence = {"": run_presence}
+
+    presence = otu_matrix.hstack([run_presence[run_id] for run_id in sorted(run_presence)])
+
+    # throw error if mapping isn't complete
+    mapping = dict(zip(enrich_taxonomy_table["Original Species"], enrich_taxonomy_table["Species"]))
+    species = normalization.map_species(presence.species, mapping)
+    if pd.isnull(species).any():
+        unmatched = presence.species[pd.isnull(species)].tolist()
+        raise ValueError(f"The following species values could not be matched in delete_extra_samples: {unmatched}. Check that all species are searched properly when Taxonomy API is searched")
+
+    presence = presence.group_max(species)
+
+    id_mapping = dict(zip(read_metadata['array_id'], read_metadata['sample_id']))
+    header = pd.read_csv(assets.OTU_IN_PATH, sep='\t', nrows=0).columns
+    sample_ids = set(presence.samples)
+    sample_cols = [id_mapping[col] for col in header if col in id_mapping and id_mapping[col] in sample_ids]
+
+    return presence.select_samples(sample_cols)
+
+
+# delete_extra_samples is rematerialized whenever a run partition is added. AutomationCondition is experimental in
+# dagster 1.8, and this is the only place it is used, so its warnings are silenced here rather than on every import
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", category=ExperimentalWarning)
+    delete_extra_samples = instrumented_asset(group_name="clean_otu_table",
+                                              automation_condition=AutomationCondition.eager())(delete_extra_samples)
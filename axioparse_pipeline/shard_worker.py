@@ -0,0 +1,25 @@
+from multiprocessing import shared_memory
+import numpy as np
+from .otu_matrix import group_max_codes
+
+# the function that sharded.sharded_clean_otu runs in its worker processes. it lives apart from the asset so that the
+# workers never import dagster
+
+
+def clean_shard(codes_name, n_probes, n_groups, values, n_pairs):
+    '''
+    Steps O.4 and O.5 for one shard of samples, run in a worker process: take the strongest state of every species in
+    each of the shard's columns (its n_pairs DNA columns followed by their RNA columns) and combine each DNA column with
+    its RNA column into binary presence. The species code of every probe is read from the shared memory block
+    codes_name.
+    '''
+    codes_memory = shared_memory.SharedMemory(name=codes_name)
+    try:
+        codes = np.ndarray(n_probes, dtype=np.int64, buffer=codes_memory.buf)
+        grouped = group_max_codes(values.tocsr(), codes, n_groups)
+    finally:
+        del codes
+        codes_memory.close()
+
+    presence = grouped[:, :n_pairs].astype(bool) + grouped[:, n_pairs:].astype(bool)
+    return presence.astype(np.uint8)
@@ -0,0 +1,86 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from . import extra_functions, shard_worker
+from .otu_matrix import OtuMatrix
+from .instrumentation import instrumented_asset
+
+# setting a number of worker processes in the .env file switches the per-sample otu cleaning steps to the sharded
+# asset below
+SAMPLE_WORKERS = int(os.getenv("AXIOPARSE_SAMPLE_WORKERS", "0"))
+
+# the in-memory steps after replace_species_names, which delete_extra_samples below covers
+REPLACED_ASSETS = {"remove_duplicates", "combine_dna_rna_probes", "delete_extra_samples"}
+
+
+def pool_context():
+    '''
+    Return the multiprocessing context for the worker pool. the asset runs in a process that already has threads
+    (dagster's and the NCBI client's), which a forked child can inherit in a locked state, so workers are started
+    from a forkserver (which only ever runs one thread), or spawned where there is none
+    '''
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+
+    # the forkserver imports the worker module once, and it leaves out dagster, so the workers forked from it start
+    # with only numpy, pandas and scipy loaded
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([shard_worker.__name__])
+    return context
+
+
+def shard_pairs(n_pairs, n_shards):
+    '''
+    Split the positions 0..n_pairs-1 into up to n_shards contiguous, non-empty ranges of about equal size
+    '''
+    return [shard for shard in np.array_split(np.arange(n_pairs), max(1, min(n_shards, n_pairs))) if len(shard)]
+
+
+def sharded_clean_otu(otu_matrix, metadata, workers):
+    '''
+    Sharded equivalent of Steps O.4 to O.6: split the dna/rna column pairs of otu_matrix into one contiguous shard
+    per worker, collapse duplicate species and combine the pairs of every shard in a process pool, and join the
+    shards back together in column order. The species codes of the probes are handed to the workers in shared
+    memory, only the columns of its shard are sent to each. Returns the same OtuMatrix as the serial assets.
+    '''
+    # throw error if any cell is not empty, Secondary or DETECTED
+    otu_matrix.check_condensed()
+
+    # pair_dna_rna_columns only pairs samples listed in the metadata, which covers Step O.6
+    pairs = extra_functions.pair_dna_rna_columns(otu_matrix.samples, metadata)
+    positions = pd.Index(otu_matrix.samples)
+    dna_positions = positions.get_indexer([dna for dna, _ in pairs])
+    rna_positions = positions.get_indexer([rna for _, rna in pairs])
+
+    codes, groups = pd.factorize(otu_matrix.species, sort=True)
+    codes = codes.astype(np.int64)
+    by_column = otu_matrix.values.tocsc()
+
+    codes_memory = shared_memory.SharedMemory(create=True, size=max(codes.nbytes, 1))
+    try:
+        np.ndarray(len(codes), dtype=np.int64, buffer=codes_memory.buf)[:] = codes
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+            futures = [pool.submit(shard_worker.clean_shard, codes_memory.name, len(codes), len(groups),
+                                   by_column[:, np.concatenate([dna_positions[shard], rna_positions[shard]])],
+                                   len(shard))
+                       for shard in shard_pairs(len(pairs), workers)]
+            shards = [future.result() for future in futures]
+    finally:
+        codes_memory.close()
+        codes_memory.unlink()
+
+    values = sparse.hstack(shards, format="csr") if shards else sparse.csr_matrix((len(groups), 0), dtype=np.uint8)
+    return OtuMatrix(values, np.asarray(groups, dtype=object), [dna for dna, _ in pairs])
+
+
+@instrumented_asset(group_name="clean_otu_table")
+def delete_extra_samples(replace_species_names, read_metadata):
+    '''
+    Steps O.4 to O.6 (sharded): collapse duplicate species, combine the dna and rna probes of each sample and keep
+    only the samples that have metadata, with the samples split across SAMPLE_WORKERS processes
+    '''
+    return sharded_clean_otu(replace_species_names, read_metadata, SAMPLE_WORKERS)
@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from . import assets, extra_functions, normalization
+from .otu_matrix import OtuMatrix
+from .instrumentation import instrumented_asset
+
+# setting a chunk size in the .env file switches the clean_otu_table group to the streaming assets below
+OTU_CHUNKSIZE = int(os.getenv("AXIOPARSE_OTU_CHUNKSIZE", "0"))
+
+# in-memory assets that the streaming assets replace. downstream assets see the same asset keys either way
+REPLACED_ASSETS = {"read_otu", "replace_sample_names", "merge_samples_to_otu", "replace_species_names",
+                   "remove_duplicates", "combine_dna_rna_probes", "delete_extra_samples"}
+
+
+def stream_clean_otu(path, metadata, species_cov, species_mapping, chunksize):
+    '''
+    Streaming equivalent of Steps R.2 and O.1 to O.6: read the otu table in chunks of chunksize rows, map every probe
+    to its updated species, combine the dna and rna probes of each sample into binary presence and fold the chunk into
+    a running per-species aggregate. Peak memory depends on the chunk size and the number of detections, not the
+    number of probes in the file. Returns the same sparse OtuMatrix as the in-memory assets.
+    '''
+    id_mapping = dict(zip(metadata['array_id'], metadata['sample_id']))
+    probe_species = species_cov[['Probe', 'Species']]
+    presence = None
+    dna_cols = None
+
+    for chunk in extra_functions.iter_otu_table(path, metadata, chunksize):
+        chunk = chunk.rename(columns={"Target Description": "Probe", **id_mapping})
+        chunk = chunk.merge(probe_species, on='Probe', how='left')
+
+        # throw error if mapping isn't complete
+        species = normalization.map_species(chunk['Species'], species_mapping)
+        if pd.isnull(species).any():
+            unmatched = chunk.loc[pd.isnull(species), "Species"].tolist()
+            raise ValueError(f"The following species values could not be matched in stream_clean_otu: {unmatched}. Check that all species are searched properly when Taxonomy API is searched")
+
+        if dna_cols is None:
+            pairs = extra_functions.pair_dna_rna_columns(chunk.columns, metadata)
+            dna_cols = [dna for dna, _ in pairs]
+            rna_cols = [rna for _, rna in pairs]
+
+        # a sample is present if either of its probes was called, and present for a species if any probe was
+        present = np.logical_or(chunk[dna_cols].notna().to_numpy(), chunk[rna_cols].notna().to_numpy())
+        partial = OtuMatrix(present.astype(np.uint8), species, dna_cols).group_max()
+        if presence is not None:
+            partial = OtuMatrix(sparse.vstack([presence.values, partial.values]),
+                                np.concatenate([presence.species, partial.species]), dna_cols).group_max()
+        presence = partial
+
+    if presence is None:
+        presence = OtuMatrix(sparse.csr_matrix((0, len(dna_cols or [])), dtype=np.uint8), [], dna_cols or [])
+
+    return presence
+
+
+@instrumented_asset(group_name="clean_otu_table")
+def merge_samples_to_otu(read_species_coverage):
+    '''
+    Step O.2 (probes only): merge the species column from species coverage onto the probe column of the otu table. the
+    sample columns are left out; the streaming and partitioned assets read them themselves
+    '''
+    return extra_functions.read_probe_species(assets.OTU_IN_PATH, read_species_coverage)
+
+
+@instrumented_asset(group_name="clean_otu_table")
+def delete_extra_samples(read_metadata, read_species_coverage, enrich_taxonomy_table):
+    '''
+    Steps R.2 and O.1 to O.6 (streaming): stream the otu table in chunks into one binary presence row per species,
+    keeping only the samples that have metadata
+    '''
+    species_mapping = dict(zip(enrich_taxonomy_table["Original Species"], enrich_taxonomy_table["Species"]))
+
+    return stream_clean_otu(assets.OTU_IN_PATH, read_metadata, read_species_coverage, species_mapping, OTU_CHUNKSIZE)
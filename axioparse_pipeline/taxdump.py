@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import sys
+import warnings
+import numpy as np
+from .taxonomy_cache import normalize_term
+
+INDEX_VERSION = 1
+
+
+def _read_dmp(path):
+    '''
+    Yield the fields of every row in an NCBI taxdump .dmp file (fields are separated by "\t|\t", rows end in "\t|")
+    '''
+    with open(path, encoding="utf-8") as dmp_file:
+        for line in dmp_file:
+            yield line.rstrip("\n").rstrip("|").rstrip("\t").split("\t|\t")
+
+
+def _hash_name(name):
+    return int.from_bytes(hashlib.blake2b(normalize_term(name).encode(), digest_size=8).digest(), "little")
+
+
+def build_taxdump_index(dump_dir, index_dir):
+    '''
+    Compile names.dmp, nodes.dmp and (if present) merged.dmp from an NCBI taxdump into a binary index. Parents, ranks
+    and scientific-name offsets are arrays indexed by tax id, and every name is stored as a sorted 64-bit hash next to
+    its tax id, so TaxdumpIndex can memory-map the files and resolve lineages without parsing anything.
+    '''
+    os.makedirs(index_dir, exist_ok=True)
+
+    nodes = [(int(fields[0]), int(fields[1]), fields[2]) for fields in _read_dmp(os.path.join(dump_dir, "nodes.dmp"))]
+    max_tax_id = max(tax_id for tax_id, _, _ in nodes)
+    ranks = sorted({rank for _, _, rank in nodes})
+    rank_codes = {rank: code for code, rank in enumerate(ranks)}
+
+    # tax ids that are not in nodes.dmp have parent 0
+    parents = np.zeros(max_tax_id + 1, dtype=np.int32)
+    rank_array = np.zeros(max_tax_id + 1, dtype=np.uint8)
+    for tax_id, parent_id, rank in nodes:
+        parents[tax_id] = parent_id
+        rank_array[tax_id] = rank_codes[rank]
+
+    scientific_names = {}
+    name_hashes = []
+    name_tax_ids = []
+    is_synonym = []
+    for fields in _read_dmp(os.path.join(dump_dir, "names.dmp")):
+        tax_id, name, name_class = int(fields[0]), fields[1], fields[3]
+        if name_class == "scientific name":
+            scientific_names[tax_id] = name
+        name_hashes.append(_hash_name(name))
+        name_tax_ids.append(tax_id)
+        is_synonym.append(name_class != "scientific name")
+
+    # concatenate the scientific names into one utf-8 blob with an offset per tax id
+    encoded = [scientific_names.get(tax_id, "").encode() for tax_id in range(max_tax_id + 1)]
+    name_offsets = np.zeros(max_tax_id + 2, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+    with open(os.path.join(index_dir, "names.bin"), "wb") as names_file:
+        names_file.write(b"".join(encoded))
+
+    # sort by hash, then scientific names before synonyms, then tax id
+    name_hashes = np.array(name_hashes, dtype=np.uint64)
+    name_tax_ids = np.array(name_tax_ids, dtype=np.int32)
+    order = np.lexsort((name_tax_ids, is_synonym, name_hashes))
+
+    merged = []
+    merged_path = os.path.join(dump_dir, "merged.dmp")
+    if os.path.exists(merged_path):
+        merged = sorted((int(fields[0]), int(fields[1])) for fields in _read_dmp(merged_path))
+
+    np.save(os.path.join(index_dir, "parents.npy"), parents)
+    np.save(os.path.join(index_dir, "ranks.npy"), rank_array)
+    np.save(os.path.join(index_dir, "name_offsets.npy"), name_offsets)
+    np.save(os.path.join(index_dir, "name_hashes.npy"), name_hashes[order])
+    np.save(os.path.join(index_dir, "name_tax_ids.npy"), name_tax_ids[order])
+    np.save(os.path.join(index_dir, "merged.npy"), np.array(merged, dtype=np.int32).reshape(-1, 2))
+    with open(os.path.join(index_dir, "meta.json"), "w") as meta_file:
+        json.dump({"version": INDEX_VERSION, "ranks": ranks}, meta_file)
+
+
+class TaxdumpIndex:
+    '''
+    Offline taxonomy backend over an index built by build_taxdump_index. It offers the same esearch, efetch and map
+    methods as NCBIClient and returns records shaped like Entrez taxonomy records, so the taxonomy helpers in
+    extra_functions work unchanged and produce the same lineage columns.
+    '''
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        if meta["version"] != INDEX_VERSION:
+            raise ValueError(f"Taxdump index in {index_dir} has version {meta['version']}, expected {INDEX_VERSION}. "
+                             "Rebuild it with build_taxdump_index.")
+
+        self.ranks = meta["ranks"]
+        load = lambda name: np.load(os.path.join(index_dir, name), mmap_mode="r")
+        self.parents = load("parents.npy")
+        self.rank_codes = load("ranks.npy")
+        self.name_offsets = load("name_offsets.npy")
+        self.name_hashes = load("name_hashes.npy")
+        self.name_tax_ids = load("name_tax_ids.npy")
+        merged = np.load(os.path.join(index_dir, "merged.npy"))
+        self.merged = dict(zip(merged[:, 0].tolist(), merged[:, 1].tolist()))
+        names_path = os.path.join(index_dir, "names.bin")
+        self.names = np.memmap(names_path, dtype=np.uint8, mode="r") if os.path.getsize(names_path) else np.zeros(0, np.uint8)
+
+    def scientific_name(self, tax_id):
+        return bytes(self.names[self.name_offsets[tax_id]:self.name_offsets[tax_id + 1]]).decode()
+
+    def rank(self, tax_id):
+        return self.ranks[self.rank_codes[tax_id]]
+
+    def lineage(self, tax_id):
+        '''
+        Return the ancestors of tax_id from the top down, leaving out the root and the taxon itself as NCBI lineages
+        do, or None if the walk up reaches a tax id that is not in the dump or loops
+        '''
+        lineage = []
+        ancestor_id = int(self.parents[tax_id])
+        while ancestor_id != 1 and ancestor_id != tax_id:
+            if ancestor_id >= len(self.parents) or self.parents[ancestor_id] == 0 or ancestor_id in lineage:
+                return None
+            lineage.insert(0, ancestor_id)
+            ancestor_id = int(self.parents[ancestor_id])
+        return lineage
+
+    def esearch(self, term):
+        '''
+        Return the tax ids of every taxon with a name matching term, scientific-name matches first
+        '''
+        name_hash = np.uint64(_hash_name(term))
+        start = np.searchsorted(self.name_hashes, name_hash, side="left")
+        end = np.searchsorted(self.name_hashes, name_hash, side="right")
+        return [str(tax_id) for tax_id in dict.fromkeys(self.name_tax_ids[start:end].tolist())]
+
+    def efetch(self, tax_ids):
+        '''
+        Return Entrez-style taxonomy records for tax_ids. Merged ids are returned under their current id with the
+        requested id in AkaTaxIds, and unknown ids are left out, as efetch does.
+        '''
+        records = []
+        for requested_id in tax_ids:
+            tax_id = self.merged.get(int(requested_id), int(requested_id))
+            if tax_id >= len(self.parents) or self.parents[tax_id] == 0:
+                continue
+
+            lineage = self.lineage(tax_id)
+            if lineage is None:
+                warnings.warn(f"Tax id {tax_id} has an ancestor missing from the taxdump, leaving it out")
+                continue
+
+            records.append({
+                'TaxId': str(tax_id),
+                'ScientificName': self.scientific_name(tax_id),
+                'ParentTaxId': str(self.parents[tax_id]),
+                'Rank': self.rank(tax_id),
+                'Lineage': "; ".join(self.scientific_name(tid) for tid in lineage),
+                'LineageEx': [{'TaxId': str(tid), 'ScientificName': self.scientific_name(tid), 'Rank': self.rank(tid)}
+                              for tid in lineage],
+                'AkaTaxIds': [str(requested_id)] if tax_id != int(requested_id) else [],
+            })
+        return records
+
+    def map(self, function, items):
+        return [function(item) for item in items]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def reset_stats(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m axioparse_pipeline.taxdump <taxdump_dir> <index_dir>")
+    build_taxdump_index(sys.argv[1], sys.argv[2])
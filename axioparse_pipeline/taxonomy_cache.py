@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# cache settings can be overridden in the .env file next to NCBI_EMAIL and NCBI_KEY
+CACHE_DIR = os.getenv("AXIOPARSE_CACHE_DIR", "./.axioparse_cache")
+CACHE_TTL_DAYS = float(os.getenv("AXIOPARSE_CACHE_TTL_DAYS", "90"))
+CACHE_EMPTY_TTL_HOURS = float(os.getenv("AXIOPARSE_CACHE_EMPTY_TTL_HOURS", "24"))
+CACHE_MAX_ENTRIES = int(os.getenv("AXIOPARSE_CACHE_MAX_ENTRIES", "100000"))
+CACHE_REFRESH = os.getenv("AXIOPARSE_CACHE_REFRESH", "").lower() in ("1", "true", "yes")
+
+TABLES = ("esearch", "efetch")
+
+
+def normalize_term(term):
+    '''
+    Normalize a search term so that differences in case and whitespace share one cache entry
+    '''
+    return " ".join(str(term).split()).lower()
+
+
+class TaxonomyCache:
+    '''
+    Persistent SQLite cache of NCBI taxonomy lookups. esearch id lists are keyed by normalized search term and efetch
+    records by TaxId. Entries older than ttl_days count as misses, as do empty results older than empty_ttl_hours,
+    each table is trimmed to the max_entries most recently used entries, and refresh=True ignores every stored entry
+    while still writing fresh results back. Access times and trimming are written by flush(), once per run.
+    '''
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl_days=CACHE_TTL_DAYS, max_entries=CACHE_MAX_ENTRIES,
+                 refresh=CACHE_REFRESH, empty_ttl_hours=CACHE_EMPTY_TTL_HOURS):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "ncbi_taxonomy.sqlite")
+        self.ttl_seconds = ttl_days * 24 * 60 * 60
+        self.empty_ttl_seconds = empty_ttl_hours * 60 * 60
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+
+        # access times of the hits and the tables written to since the last flush
+        self.accessed = {table: {} for table in TABLES}
+        self.written = set()
+
+        # lookups run on the NCBI client's thread pool, so the connection is shared behind a lock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        # with a write-ahead log, commits only sync at checkpoints, so storing a lookup does not wait for the disk
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for table in TABLES:
+                self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                                        "(key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)")
+
+    def get(self, table, key):
+        '''
+        Return the cached value for key, or None if it is missing, expired or refresh is set
+        '''
+        with self.lock:
+            row = None
+            if not self.refresh:
+                row = self.connection.execute(f"SELECT value, created FROM {table} WHERE key = ?", (key,)).fetchone()
+
+            # a search that found nothing may succeed once NCBI adds the name, so empty results expire sooner
+            ttl_seconds = self.empty_ttl_seconds if row is not None and row[0] == "[]" else self.ttl_seconds
+            if row is None or time.time() - row[1] > ttl_seconds:
+                self.misses += 1
+                return None
+
+            self.accessed[table][key] = time.time()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, table, key, value):
+        '''
+        Store value under key
+        '''
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)",
+                                    (key, json.dumps(value), now, now))
+            self.accessed[table].pop(key, None)
+            self.written.add(table)
+
+    def flush(self):
+        '''
+        Write the access times of the hits since the last flush in one transaction, and evict the least recently used
+        entries of every table that was written to and is now over max_entries
+        '''
+        with self.lock, self.connection:
+            for table in TABLES:
+                self.connection.executemany(f"UPDATE {table} SET accessed = ? WHERE key = ?",
+                                            [(accessed, key) for key, accessed in self.accessed[table].items()])
+                self.accessed[table].clear()
+
+            for table in self.written:
+                excess = self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self.connection.execute(f"DELETE FROM {table} WHERE key IN "
+                                            f"(SELECT key FROM {table} ORDER BY accessed LIMIT ?)", (excess,))
+            self.written.clear()
+
+    def get_search(self, term):
+        return self.get("esearch", normalize_term(term))
+
+    def put_search(self, term, id_list):
+        self.put("esearch", normalize_term(term), list(id_list))
+
+    def get_lineage(self, tax_id):
+        return self.get("efetch", str(tax_id).strip())
+
+    def put_lineage(self, tax_id, record):
+        self.put("efetch", str(tax_id).strip(), record)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"ncbi_cache_hits": self.hits, "ncbi_cache_misses": self.misses}
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import time
+import pandas as pd
+from .taxonomy_cache import CACHE_DIR, CACHE_REFRESH, CACHE_TTL_DAYS
+
+# manifest settings can be overridden in the .env file next to NCBI_EMAIL and NCBI_KEY
+MANIFEST_DIR = os.getenv("AXIOPARSE_MANIFEST_DIR", os.path.join(CACHE_DIR, "manifests"))
+BUILD_MANIFEST = os.getenv("AXIOPARSE_BUILD_MANIFEST", "").lower() in ("1", "true", "yes")
+
+# bump when the lineage columns or how they are resolved change, so old manifests are rebuilt
+MANIFEST_VERSION = 2
+
+
+def coverage_hash(species_cov):
+    '''
+    Content hash of a species coverage table. the table is fixed for a given axiom array version, so the hash
+    identifies the array
+    '''
+    content = species_cov[['Probe', 'Domain', 'Family', 'Species']].to_csv(index=False)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def manifest_path(species_cov, backend, manifest_dir=None):
+    return os.path.join(manifest_dir or MANIFEST_DIR,
+                        f"taxonomy_v{MANIFEST_VERSION}_{backend}_{coverage_hash(species_cov)}.json")
+
+
+def load_manifest(species_cov, backend, manifest_dir=None, ttl_seconds=CACHE_TTL_DAYS * 24 * 60 * 60,
+                  refresh=CACHE_REFRESH):
+    '''
+    Return the Original Species -> lineage table stored for this species coverage file and taxonomy backend ("ncbi"
+    or "taxdump"), or None if there is none, it was built more than ttl_seconds ago or refresh is set. The manifest
+    follows the same TTL and refresh settings as the NCBI cache.
+    '''
+    path = manifest_path(species_cov, backend, manifest_dir)
+    if refresh or not os.path.exists(path):
+        return None
+
+    with open(path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest["version"] != MANIFEST_VERSION or manifest["coverage_hash"] != coverage_hash(species_cov) \
+            or manifest["backend"] != backend or time.time() - manifest["built_at"] > ttl_seconds:
+        return None
+
+    return pd.DataFrame(manifest["lineages"], columns=manifest["columns"])
+
+
+def write_manifest(species_cov, backend, tax_df, manifest_dir=None):
+    '''
+    Store tax_df as the taxonomy manifest of this species coverage file and taxonomy backend and return it
+    '''
+    os.makedirs(manifest_dir or MANIFEST_DIR, exist_ok=True)
+    manifest = {"version": MANIFEST_VERSION,
+                "coverage_hash": coverage_hash(species_cov),
+                "backend": backend,
+                "built_at": time.time(),
+                "columns": tax_df.columns.tolist(),
+                "lineages": tax_df.values.tolist()}
+
+    # write to a temporary file first so an interrupted run never leaves a partial manifest behind
+    path = manifest_path(species_cov, backend, manifest_dir)
+    with open(path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(path + ".tmp", path)
+
+    return tax_df
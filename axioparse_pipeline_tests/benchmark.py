@@ -0,0 +1,184 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+import pandas as pd
+from dagster import DagsterInstance, materialize
+from axioparse_pipeline import assets, extra_functions, ncbi_client, taxonomy_cache, taxonomy_manifest
+from .fake_entrez import FakeEntrez
+from .synthetic import SPEC_COV_PATH, generate_dataset, synthetic_taxa
+
+# probes x samples
+SCALES = {"small": (2000, 6), "medium": (20000, 96), "large": (100000, 384)}
+RESULTS_PATH = './benchmark_results.jsonl'
+
+# a slowdown or memory increase counts as a regression if it is over the threshold and over the noise floor
+REGRESSION_THRESHOLD = 0.2
+NOISE_FLOOR = {"seconds": 0.05, "peak_mb": 1.0}
+
+
+def current_commit():
+    '''
+    Return the short hash of the checked out commit, with -dirty appended if the working tree has changes
+    '''
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+@contextlib.contextmanager
+def synthetic_environment(work_dir, n_probes, n_samples, density, species_cov_path):
+    '''
+    Generate a synthetic dataset in work_dir and point the pipeline at it: input paths, working directory (the writers
+    write to ./data_out), taxonomy cache and manifests, and an NCBI client talking to a local FakeEntrez that knows
+    every species of the dataset
+    '''
+    data_dir = os.path.join(work_dir, "data")
+    generate_dataset(data_dir, n_probes, n_samples, density=density, species_cov_path=os.path.abspath(species_cov_path))
+    os.makedirs(os.path.join(work_dir, "data_out"), exist_ok=True)
+    species_cov = pd.read_csv(os.path.join(data_dir, "array_species_coverage.csv"))
+
+    with contextlib.ExitStack() as stack, FakeEntrez(taxa=synthetic_taxa(species_cov)) as fake:
+        client = ncbi_client.NCBIClient(email="benchmark@example.com", base_url=fake.url, rate=1000, backoff=0)
+        cache = taxonomy_cache.TaxonomyCache(cache_dir=os.path.join(work_dir, "cache"), refresh=False)
+        for target, name, value in [(assets, "OTU_IN_PATH", os.path.join(data_dir, "otu_table.txt")),
+                                    (assets, "METADATA_IN_PATH", os.path.join(data_dir, "metadata.csv")),
+                                    (assets, "SPEC_COV_IN_PATH", os.path.join(data_dir, "array_species_coverage.csv")),
+                                    (extra_functions, "_client", client), (extra_functions, "_cache", cache),
+                                    (extra_functions.Entrez, "email", "benchmark@example.com"),
+                                    (extra_functions.Entrez, "api_key", "benchmark"),
+                                    (taxonomy_manifest, "MANIFEST_DIR", os.path.join(work_dir, "manifests"))]:
+            stack.enter_context(mock.patch.object(target, name, value))
+        stack.enter_context(working_directory(work_dir))
+        yield
+
+
+def benchmark_scale(n_probes, n_samples, density=0.05, species_cov_path=SPEC_COV_PATH, trace_memory=True):
+    '''
+    Materialize every asset of the pipeline on a synthetic dataset of n_probes x n_samples, one asset at a time in
+    dependency order, and return one row per asset with its step time and (if trace_memory) the peak memory allocated
+    while it ran, including loading its inputs. Times include the tracemalloc overhead when memory is traced.
+    '''
+    from axioparse_pipeline import defs
+
+    repository = defs.get_repository_def()
+    assets_defs = list({id(assets_def): assets_def for assets_def in repository.assets_defs_by_key.values()}.values())
+    resources = repository.get_top_level_resources()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir, \
+            DagsterInstance.ephemeral(tempdir=os.path.join(work_dir, "dagster")) as instance, \
+            synthetic_environment(work_dir, n_probes, n_samples, density, species_cov_path):
+        for asset_key in repository.asset_graph.toposorted_asset_keys:
+            partitions_def = repository.assets_defs_by_key[asset_key].partitions_def
+            partition_keys = [None]
+            if partitions_def is not None:
+                header = pd.read_csv(assets.OTU_IN_PATH, sep='\t', nrows=0).columns
+                partition_keys = extra_functions.list_array_runs(header, pd.read_csv(assets.METADATA_IN_PATH))
+                instance.add_dynamic_partitions(partitions_def.name, partition_keys)
+
+            seconds, peak = 0.0, 0
+            for partition_key in partition_keys:
+                if trace_memory:
+                    tracemalloc.start()
+                start = time.perf_counter()
+                result = materialize(assets_defs, selection=[asset_key], instance=instance, resources=resources,
+                                     partition_key=partition_key)
+                wall = time.perf_counter() - start
+                if trace_memory:
+                    peak = max(peak, tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+
+                step_events = result.get_step_success_events()
+                seconds += step_events[0].event_specific_data.duration_ms / 1000 if step_events else wall
+
+            rows.append({"asset": asset_key.to_user_string(), "seconds": round(seconds, 4),
+                         "peak_mb": round(peak / 2**20, 2) if trace_memory else None})
+            print(f"{asset_key.to_user_string()}: {seconds:.3f} s" + (f", {peak / 2**20:.1f} MB" if trace_memory else ""))
+
+    return rows
+
+
+def find_regressions(rows, history, threshold=REGRESSION_THRESHOLD):
+    '''
+    Compare benchmark rows with the most recent result of the same asset at the same scale from another commit.
+    Returns a list of (asset, metric, previous, current) for every metric that grew by more than threshold.
+    '''
+    regressions = []
+    for row in rows:
+        scale = (row["n_probes"], row["n_samples"], row["density"])
+        previous = [old for old in history if old["asset"] == row["asset"] and old["commit"] != row["commit"]
+                    and (old["n_probes"], old["n_samples"], old["density"]) == scale]
+        if not previous:
+            continue
+
+        previous = previous[-1]
+        for metric, floor in NOISE_FLOOR.items():
+            if row.get(metric) is None or previous.get(metric) is None:
+                continue
+            if row[metric] > previous[metric] * (1 + threshold) and row[metric] - previous[metric] > floor:
+                regressions.append((row["asset"], metric, previous[metric], row[metric]))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and memory-profile every asset on synthetic Axiom datasets")
+    parser.add_argument("--scale", nargs="+", default=["small"], choices=sorted(SCALES),
+                        help="dataset sizes to run: " + ", ".join(f"{name} = {p} probes x {s} samples" for name, (p, s) in SCALES.items()))
+    parser.add_argument("--density", type=float, default=0.05, help="share of called cells in the otu table")
+    parser.add_argument("--species-coverage", default=SPEC_COV_PATH, help="species coverage file to draw probes from")
+    parser.add_argument("--results", default=RESULTS_PATH, help="json lines file the results are appended to")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc, for times without its overhead")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 if anything regressed")
+    args = parser.parse_args(argv)
+
+    history = []
+    if os.path.exists(args.results):
+        with open(args.results) as results_file:
+            history = [json.loads(line) for line in results_file if line.strip()]
+
+    commit = current_commit()
+    timestamp = datetime.datetime.now().isoformat(timespec="seconds")
+    regressions = []
+    for scale in args.scale:
+        n_probes, n_samples = SCALES[scale]
+        print(f"benchmarking {scale}: {n_probes} probes x {n_samples} samples at density {args.density}")
+        rows = [{"commit": commit, "timestamp": timestamp, "scale": scale, "n_probes": n_probes,
+                 "n_samples": n_samples, "density": args.density, **row}
+                for row in benchmark_scale(n_probes, n_samples, args.density, args.species_coverage, not args.no_memory)]
+        regressions += find_regressions(rows, history)
+
+        with open(args.results, "a") as results_file:
+            for row in rows:
+                results_file.write(json.dumps(row) + "\n")
+
+    for asset, metric, previous, current in regressions:
+        print(f"REGRESSION {asset} {metric}: {previous} -> {current}")
+    print(f"results appended to {args.results}")
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
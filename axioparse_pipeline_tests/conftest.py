@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from axioparse_pipeline import assets, extra_functions, ncbi_client, taxonomy_cache, taxonomy_manifest
+from .fake_entrez import FakeEntrez
+from .invoke import invoke
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = taxonomy_cache.TaxonomyCache(cache_dir=str(tmp_path / "cache"), ttl_days=1, max_entries=100, refresh=False)
+    monkeypatch.setattr(extra_functions, "_cache", cache)
+    monkeypatch.setattr(taxonomy_manifest, "MANIFEST_DIR", str(tmp_path / "manifests"))
+    return cache
+
+
+@pytest.fixture
+def fake_entrez(cache, monkeypatch):
+    '''
+    Point the shared NCBI client at a local fake Entrez server for the duration of a test
+    '''
+    with FakeEntrez() as fake:
+        client = ncbi_client.NCBIClient(email="test@example.com", base_url=fake.url, rate=1000, backoff=0)
+        monkeypatch.setattr(extra_functions, "_client", client)
+        yield fake
+
+
+@pytest.fixture(scope="session")
+def data_in():
+    '''
+    Read the metadata and species coverage in data_in, with a tax table that collapses every Bacteroides species into
+    one so that the duplicate merge has something to do
+    '''
+    metadata = invoke(assets.read_metadata)
+    species_cov = invoke(assets.read_species_coverage)
+    species = sorted(species_cov["Species"].unique())
+    tax_table = pd.DataFrame({"Original Species": species,
+                              "Species": ["Bacteroides" if "Bacteroides" in name else name for name in species]})
+    return metadata, species_cov, tax_table
+
+
+@pytest.fixture(scope="session")
+def in_memory_clean_otu(data_in):
+    '''
+    Run the in-memory clean_otu_table assets on data_in and return the output of each by asset name
+    '''
+    metadata, species_cov, tax_table = data_in
+    outputs = {"read_otu": invoke(assets.read_otu, metadata)}
+    outputs["replace_sample_names"] = invoke(assets.replace_sample_names, outputs["read_otu"], metadata)
+    outputs["merge_samples_to_otu"] = invoke(assets.merge_samples_to_otu, outputs["replace_sample_names"], species_cov)
+    outputs["replace_species_names"] = invoke(assets.replace_species_names, outputs["merge_samples_to_otu"], tax_table)
+    outputs["remove_duplicates"] = invoke(assets.remove_duplicates, outputs["replace_species_names"])
+    outputs["combine_dna_rna_probes"] = invoke(assets.combine_dna_rna_probes, outputs["remove_duplicates"], metadata)
+    outputs["delete_extra_samples"] = invoke(assets.delete_extra_samples, outputs["combine_dna_rna_probes"], metadata)
+    return outputs
@@ -0,0 +1,124 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+ESEARCH_HEADER = ('<?xml version="1.0" encoding="UTF-8" ?>\n<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+                  '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">\n')
+EFETCH_HEADER = ('<?xml version="1.0" ?>\n<!DOCTYPE TaxaSet PUBLIC "-//NLM//DTD Taxon, 14th January 2002//EN" '
+                 '"https://www.ncbi.nlm.nih.gov/entrez/query/DTD/taxon.dtd">\n')
+
+# a small taxonomy: tax id -> (scientific name, rank, parent tax id)
+TAXA = {
+    "1": ("root", "no rank", "1"),
+    "131567": ("cellular organisms", "no rank", "1"),
+    "2": ("Bacteria", "superkingdom", "131567"),
+    "1224": ("Pseudomonadota", "phylum", "2"),
+    "1236": ("Gammaproteobacteria", "class", "1224"),
+    "91347": ("Enterobacterales", "order", "1236"),
+    "543": ("Enterobacteriaceae", "family", "91347"),
+    "561": ("Escherichia", "genus", "543"),
+    "562": ("Escherichia coli", "species", "561"),
+    "1239": ("Bacillota", "phylum", "2"),
+    "91061": ("Bacilli", "class", "1239"),
+    "186826": ("Lactobacillales", "order", "91061"),
+    "1300": ("Streptococcaceae", "family", "186826"),
+    "1301": ("Streptococcus", "genus", "1300"),
+    "1314": ("Streptococcus pyogenes", "species", "1301"),
+}
+
+
+class FakeEntrez:
+    '''
+    Local HTTP server that answers taxonomy esearch/efetch requests from a small in-memory taxonomy, for use as the
+    base_url of an NCBIClient. Search terms match scientific names case-insensitively. merged maps old tax ids to their
+    current one, fail_ids always return HTTP 500, the next throttle requests return HTTP 429 and the next disconnect
+    requests are closed without a response.
+    '''
+
+    def __init__(self, taxa=TAXA, merged=None, fail_ids=(), throttle=0, disconnect=0):
+        self.taxa = taxa
+        self.merged = merged or {}
+        self.fail_ids = set(fail_ids)
+        self.throttle = throttle
+        self.disconnect = disconnect
+        self.requests = []
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.respond(parse_qs(urlparse(self.path).query))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+                self.respond(parse_qs(body))
+
+            def respond(self, params):
+                utility = urlparse(self.path).path.rsplit("/", 1)[-1]
+                status, body = fake.handle(utility, {key: values[0] for key, values in params.items()})
+                if status is None:
+                    self.close_connection = True
+                    return
+                self.send_response(status)
+                self.send_header("Content-Type", "text/xml")
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, utility, params):
+        self.requests.append((utility, params))
+        if self.disconnect:
+            self.disconnect -= 1
+            return None, ""
+        if self.throttle:
+            self.throttle -= 1
+            return 429, ""
+
+        if utility == "esearch.fcgi":
+            term = params.get("term", "").lower()
+            ids = [tax_id for tax_id, (name, _, _) in self.taxa.items() if name.lower() == term]
+            id_xml = "".join(f"<Id>{tax_id}</Id>" for tax_id in ids)
+            return 200, (f"{ESEARCH_HEADER}<eSearchResult><Count>{len(ids)}</Count><RetMax>{len(ids)}</RetMax>"
+                         f"<RetStart>0</RetStart><IdList>{id_xml}</IdList><TranslationSet/></eSearchResult>")
+
+        if utility == "efetch.fcgi":
+            ids = params.get("id", "").split(",")
+            if self.fail_ids.intersection(ids):
+                return 500, ""
+            records = [self.taxon_xml(tax_id) for tax_id in ids if self.merged.get(tax_id, tax_id) in self.taxa]
+            return 200, f"{EFETCH_HEADER}<TaxaSet>{''.join(records)}</TaxaSet>"
+
+        return 404, ""
+
+    def taxon_xml(self, tax_id):
+        current_id = self.merged.get(tax_id, tax_id)
+        name, rank, parent_id = self.taxa[current_id]
+
+        # NCBI lineages run from the top down and leave out the root and the taxon itself
+        lineage = []
+        ancestor_id = parent_id
+        while ancestor_id != "1":
+            lineage.insert(0, ancestor_id)
+            ancestor_id = self.taxa[ancestor_id][2]
+
+        lineage_ex = "".join(f"<Taxon><TaxId>{tid}</TaxId><ScientificName>{escape(self.taxa[tid][0])}</ScientificName>"
+                             f"<Rank>{self.taxa[tid][1]}</Rank></Taxon>" for tid in lineage)
+        aka = f"<AkaTaxIds><TaxId>{tax_id}</TaxId></AkaTaxIds>" if current_id != tax_id else ""
+        return (f"<Taxon><TaxId>{current_id}</TaxId><ScientificName>{escape(name)}</ScientificName>"
+                f"<ParentTaxId>{parent_id}</ParentTaxId><Rank>{rank}</Rank>"
+                f"<Lineage>{escape('; '.join(self.taxa[tid][0] for tid in lineage))}</Lineage>"
+                f"<LineageEx>{lineage_ex}</LineageEx>{aka}</Taxon>")
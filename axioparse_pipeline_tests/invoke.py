@@ -0,0 +1,13 @@
+import inspect
+from dagster import Output
+
+
+def invoke(assets_def, *args, **kwargs):
+    '''
+    Invoke an asset directly and return its value. assets with checks return their value as an Output followed by the
+    check results, which are dropped here
+    '''
+    result = assets_def(*args, **kwargs)
+    if not inspect.isgenerator(result):
+        return result
+    return next(event.value for event in list(result) if isinstance(event, Output))
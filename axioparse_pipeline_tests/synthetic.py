@@ -0,0 +1,83 @@
+import os
+import string
+import numpy as np
+import pandas as pd
+
+SPEC_COV_PATH = './data/array_species_coverage.csv'
+WELLS = [f"{row}{col:02d}" for row in "ABCDEFGH" for col in range(1, 13)]
+
+
+def generate_dataset(out_dir, n_probes, n_samples, density=0.05, detected_share=0.3, species_cov_path=SPEC_COV_PATH,
+                     seed=0):
+    '''
+    Write a synthetic Axiom export to out_dir: otu_table.txt with a DNA and an RNA column for each of n_samples samples,
+    metadata.csv for those samples and array_species_coverage.csv. Probes are drawn from the real species coverage file;
+    beyond its size they are repeated under new probe names, which are added to the written coverage file. Each cell is
+    called with probability density, as DETECTED for detected_share of the calls and Secondary otherwise. Samples fill
+    96-well plates, with DNA plates on runs 424, 432, ... and the matching RNA plates 4 runs later.
+    '''
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    species_cov = pd.read_csv(species_cov_path)
+    rows = rng.permutation(len(species_cov))
+    rows = np.concatenate([rows, rng.integers(0, len(species_cov), max(0, n_probes - len(species_cov)))])[:n_probes]
+    species_cov = species_cov.iloc[rows].reset_index(drop=True)
+    copies = species_cov.groupby("Sequence").cumcount()
+    species_cov["Sequence"] = species_cov["Sequence"].where(copies == 0, species_cov["Sequence"] + " copy " + copies.astype(str))
+    species_cov.to_csv(os.path.join(out_dir, "array_species_coverage.csv"), index=False)
+
+    array_ids = []
+    for i in range(n_samples):
+        plate, well = divmod(i, len(WELLS))
+        chip = f"a{100000 + i}-{rng.integers(1000000, 9999999)}-070525"
+        array_ids.append((f"{chip}-{424 + 8 * plate}_{WELLS[well]}", f"{chip}-{428 + 8 * plate}_{WELLS[well]}"))
+
+    otu_table = {"Target Description": species_cov["Sequence"]}
+    calls = np.array(["", "Secondary", "DETECTED"], dtype=object)
+    for array_id in [dna for dna, _ in array_ids] + [rna for _, rna in array_ids]:
+        called = rng.random(n_probes) < density
+        detected = rng.random(n_probes) < detected_share
+        otu_table[array_id] = calls[called * (1 + detected)]
+    pd.DataFrame(otu_table).to_csv(os.path.join(out_dir, "otu_table.txt"), sep="\t", index=False)
+
+    # three samples (trimesters) per subject
+    groups = rng.choice(["C", "P"], n_samples // 3 + 1)
+    subjects = [f"{groups[i // 3]}.{100 + i // 3}" for i in range(n_samples)]
+    metadata = pd.DataFrame({"sample_id": [f"{subject}.{i % 3 + 1}" for i, subject in enumerate(subjects)],
+                             "array_id": [dna for dna, _ in array_ids],
+                             "group": [subject[0] for subject in subjects],
+                             "trimester": [i % 3 + 1 for i in range(n_samples)],
+                             "subject_id": subjects,
+                             "age": rng.integers(18, 45, n_samples),
+                             "race": rng.choice(["White", "Black", "Asian", "Other"], n_samples),
+                             "socioeconomic_factors": rng.choice(["None", "Low income"], n_samples)})
+    metadata.to_csv(os.path.join(out_dir, "metadata.csv"), index=False)
+
+
+def synthetic_taxa(species_cov):
+    '''
+    Build a taxonomy for FakeEntrez in which every species of species_cov is a species-rank taxon under its genus (the
+    first word of its name) and its family from the coverage file, so every species resolves on the first search
+    '''
+    taxa = {"1": ("root", "no rank", "1"), "2": ("Bacteria", "superkingdom", "1"),
+            "3": ("Synthetic phylum", "phylum", "2"), "4": ("Synthetic class", "class", "3"),
+            "5": ("Synthetic order", "order", "4")}
+    species_names = set(species_cov["Species"].dropna())
+    tax_ids = {}
+
+    def add(name, rank, parent_id):
+        # higher taxa that share a name with a species get a suffix so searches for the species stay unique
+        if rank != "species" and name in species_names:
+            name = f"{name} {rank}"
+        if (name, rank) not in tax_ids:
+            tax_ids[(name, rank)] = str(len(taxa) + 1)
+            taxa[tax_ids[(name, rank)]] = (name, rank, parent_id)
+        return tax_ids[(name, rank)]
+
+    for family, species in species_cov[["Family", "Species"]].dropna().drop_duplicates(subset="Species").itertuples(index=False):
+        family_id = add(family, "family", "5")
+        genus_id = add(species.split()[0].strip(string.punctuation), "genus", family_id)
+        add(species, "species", genus_id)
+
+    return taxa
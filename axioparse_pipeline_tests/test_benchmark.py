@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+from axioparse_pipeline import extra_functions
+from .benchmark import benchmark_scale, find_regressions
+from .synthetic import generate_dataset, synthetic_taxa
+
+
+@pytest.mark.data_in
+def test_generate_dataset_pairs_dna_and_rna_columns(tmp_path):
+    generate_dataset(tmp_path, n_probes=3000, n_samples=100, density=0.1)
+
+    otu_table = pd.read_csv(tmp_path / "otu_table.txt", sep='\t')
+    metadata = pd.read_csv(tmp_path / "metadata.csv")
+    species_cov = pd.read_csv(tmp_path / "array_species_coverage.csv")
+
+    assert otu_table.shape == (3000, 201)
+    assert set(otu_table["Target Description"]) == set(species_cov["Sequence"])
+    assert 0.08 < otu_table.iloc[:, 1:].notna().to_numpy().mean() < 0.12
+    assert set(otu_table.iloc[:, 1:].stack()) == {"Secondary", "DETECTED"}
+    assert metadata["sample_id"].is_unique
+    assert extra_functions.list_array_runs(otu_table.columns, metadata) == ["424", "432"]
+
+    renamed = otu_table.rename(columns=dict(zip(metadata["array_id"], metadata["sample_id"])))
+    assert len(extra_functions.pair_dna_rna_columns(renamed.columns, metadata)) == 100
+
+
+@pytest.mark.data_in
+def test_synthetic_taxa_names_every_species_once():
+    species_cov = pd.read_csv("./data/array_species_coverage.csv")
+
+    taxa = synthetic_taxa(species_cov)
+
+    species_names = [name for name, rank, _ in taxa.values() if rank == "species"]
+    assert sorted(species_names) == sorted(species_cov["Species"].dropna().unique())
+    all_names = [name.lower() for name, _, _ in taxa.values()]
+    assert all(all_names.count(name.lower()) == 1 for name in species_names)
+
+
+@pytest.mark.data_in
+def test_benchmark_scale_materializes_every_asset():
+    rows = benchmark_scale(n_probes=300, n_samples=4)
+
+    assets = {row["asset"] for row in rows}
+    assert {"read_otu", "enrich_taxonomy_table", "write_otu_qiime", "write_otu_r"} <= assets
+    assert all(row["seconds"] > 0 and row["peak_mb"] > 0 for row in rows)
+
+
+def test_find_regressions_compares_with_the_last_other_commit():
+    scale = {"n_probes": 10, "n_samples": 2, "density": 0.05}
+    history = [{"commit": "a", "asset": "read_otu", "seconds": 1.0, "peak_mb": 100.0, **scale},
+               {"commit": "b", "asset": "read_otu", "seconds": 2.0, "peak_mb": 100.0, **scale},
+               {"commit": "b", "asset": "read_otu", "seconds": 1.0, "peak_mb": 100.0, "n_probes": 99, "n_samples": 2,
+                "density": 0.05}]
+    rows = [{"commit": "c", "asset": "read_otu", "seconds": 2.1, "peak_mb": 130.0, **scale}]
+
+    assert find_regressions(rows, history) == [("read_otu", "peak_mb", 100.0, 130.0)]
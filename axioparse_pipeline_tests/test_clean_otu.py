@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from axioparse_pipeline import assets, extra_functions
+from axioparse_pipeline.otu_matrix import OtuMatrix
+from .invoke import invoke
+
+
+def test_remove_duplicates_keeps_strongest_state():
+    otu_table = pd.DataFrame({"Species": ["b", "a", "b", "a"],
+                              "S1": ["DETECTED", np.nan, np.nan, "Secondary"],
+                              "S2": [np.nan, np.nan, "Secondary", np.nan]})
+
+    result = invoke(assets.remove_duplicates, OtuMatrix.from_frame(otu_table)).to_frame()
+
+    # states: 0 = missing, 1 = Secondary, 2 = DETECTED
+    assert result["Species"].tolist() == ["a", "b"]
+    assert result["S1"].tolist() == [1, 2]
+    assert result["S2"].tolist() == [0, 1]
+
+
+def test_remove_duplicates_rejects_unexpected_values():
+    otu_table = pd.DataFrame({"Species": ["a", "a"], "S1": ["Secondary", "maybe"]})
+
+    with pytest.raises(ValueError, match="Lines not condensed at row 1 and column 1"):
+        invoke(assets.remove_duplicates, OtuMatrix.from_frame(otu_table))
+
+
+def test_combine_dna_rna_probes_pairs_columns_by_array_id():
+    metadata = pd.DataFrame({"sample_id": ["S1", "S2"],
+                             "array_id": ["a1-2-010125-424_A01", "a3-4-010125-424_A02"]})
+    # rna columns deliberately listed out of order relative to their dna partners
+    otu_table = pd.DataFrame({"Species": ["a", "b"],
+                              "S1": [np.nan, "Secondary"],
+                              "S2": [np.nan, np.nan],
+                              "a3-4-010125-428_A02": ["DETECTED", np.nan],
+                              "a1-2-010125-428_A01": [np.nan, np.nan]})
+
+    result = invoke(assets.combine_dna_rna_probes, OtuMatrix.from_frame(otu_table), metadata).to_frame()
+
+    assert result.columns.tolist() == ["Species", "S1", "S2"]
+    assert result["S1"].tolist() == [0, 1]
+    assert result["S2"].tolist() == [1, 0]
+
+
+def test_combine_dna_rna_probes_rejects_unpaired_samples():
+    metadata = pd.DataFrame({"sample_id": ["S1"], "array_id": ["a1-2-010125-424_A01"]})
+    otu_table = pd.DataFrame({"Species": ["a"], "S1": [np.nan], "a9-9-010125-428_A01": ["Secondary"]})
+
+    with pytest.raises(ValueError, match="Could not pair DNA and RNA columns"):
+        invoke(assets.combine_dna_rna_probes, OtuMatrix.from_frame(otu_table), metadata)
+
+
+@pytest.mark.parametrize("engine", ["c", "pyarrow"])
+def test_read_otu_only_reads_mapped_samples(tmp_path, monkeypatch, engine):
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    otu_path = tmp_path / "otu_table.txt"
+    otu_path.write_text("Target Description\ta1-2-010125-424_A01\ta5-6-010125-424_A02\ta1-2-010125-428_A01\n"
+                        "probe b\tSecondary\tDETECTED\t\n"
+                        "probe a\t\t\tDETECTED\n")
+    monkeypatch.setattr(assets, "OTU_IN_PATH", str(otu_path))
+    monkeypatch.setattr(assets, "CSV_ENGINE", engine)
+    metadata = pd.DataFrame({"sample_id": ["S1"], "array_id": ["a1-2-010125-424_A01"]})
+
+    otu_table = invoke(assets.read_otu, metadata)
+
+    assert otu_table.columns.tolist() == ["Probe", "a1-2-010125-424_A01", "a1-2-010125-428_A01"]
+    assert otu_table["Probe"].tolist() == ["probe a", "probe b"]
+    assert (otu_table.dtypes.iloc[1:] == extra_functions.DETECTION_DTYPE).all()
+    assert otu_table["a1-2-010125-428_A01"].tolist()[0] == "DETECTED"
+
+
+def test_read_otu_rejects_unexpected_values(tmp_path, monkeypatch):
+    otu_path = tmp_path / "otu_table.txt"
+    otu_path.write_text("Target Description\ta1-2-010125-424_A01\nprobe a\tmaybe\n")
+    monkeypatch.setattr(assets, "OTU_IN_PATH", str(otu_path))
+    metadata = pd.DataFrame({"sample_id": ["S1"], "array_id": ["a1-2-010125-424_A01"]})
+
+    with pytest.raises(ValueError, match="unexpected values"):
+        invoke(assets.read_otu, metadata)
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(args, cwd):
+    env = {**os.environ, "PYTHONPATH": PACKAGE_ROOT}
+    env.pop("DAGSTER_HOME", None)
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True)
+
+
+def test_cli_does_not_import_the_pipeline(tmp_path):
+    imported = run_python(["-c", "import sys, axioparse_pipeline.cli; print(sorted({'dagster', 'pandas', 'biom'} & set(sys.modules)))"],
+                          cwd=tmp_path)
+
+    assert imported.stdout.strip() == "[]"
+
+
+def test_definitions_only_load_duckdb_for_the_columnar_export(tmp_path, monkeypatch):
+    script = "import sys, axioparse_pipeline.definitions; print(sorted({'duckdb', 'dagster_duckdb'} & set(sys.modules)))"
+
+    monkeypatch.delenv("AXIOPARSE_COLUMNAR_EXPORT", raising=False)
+    assert run_python(["-c", script], cwd=tmp_path).stdout.strip() == "[]"
+    monkeypatch.setenv("AXIOPARSE_COLUMNAR_EXPORT", "true")
+    assert run_python(["-c", script], cwd=tmp_path).stdout.strip() == "['dagster_duckdb', 'duckdb']"
+
+
+@pytest.mark.data_in
+def test_cli_runs_a_selection_with_path_arguments(tmp_path):
+    data_dir = os.path.join(PACKAGE_ROOT, "data")
+
+    result = run_python(["-m", "axioparse_pipeline.cli", "run", "--otu-table", os.path.join(data_dir, "otu_table.txt"),
+                         "--metadata", os.path.join(data_dir, "metadata.csv"),
+                         "--species-coverage", os.path.join(data_dir, "array_species_coverage.csv"),
+                         "--out-dir", "results", "--select", "group:read_data", "write_metadata_r"], cwd=tmp_path)
+
+    assert result.returncode == 0, result.stderr
+    assert os.listdir(tmp_path / "results") == ["metadata_r.csv"]
+    metadata = pd.read_csv(os.path.join(data_dir, "metadata.csv"))
+    assert pd.read_csv(tmp_path / "results" / "metadata_r.csv", index_col=0).index.tolist() == metadata["sample_id"].tolist()
+
+
+def test_cli_fails_on_an_unknown_asset(tmp_path):
+    result = run_python(["-m", "axioparse_pipeline.cli", "run", "--out-dir", "results", "--select", "no_such_asset"],
+                        cwd=tmp_path)
+
+    assert result.returncode != 0
@@ -0,0 +1,56 @@
+import os
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+from dagster_duckdb import DuckDBResource
+from axioparse_pipeline import columnar
+from axioparse_pipeline.otu_matrix import OtuMatrix
+from .invoke import invoke
+
+pytest.importorskip("pyarrow")
+
+
+# the out dir is part of the sql that reads the exports back, so one of them needs quoting
+@pytest.fixture(params=["data_out", "o'brien lab"])
+def exports(request, tmp_path, monkeypatch):
+    out_dir = tmp_path / request.param
+    out_dir.mkdir()
+    for name in ("OTU", "TAXONOMY", "METADATA"):
+        path = getattr(columnar, f"{name}_PARQUET_PATH")
+        monkeypatch.setattr(columnar, f"{name}_PARQUET_PATH", str(out_dir / os.path.basename(path)))
+    otu_matrix = OtuMatrix(np.array([[0, 1], [1, 1]], dtype=np.uint8), ["Streptococcus pyogenes", "Escherichia coli"],
+                           ["S1", "S2"])
+    taxonomy = pd.DataFrame({"Domain": ["Bacteria", "Bacteria"], "Genus": ["Escherichia", "Streptococcus"],
+                             "Species": ["Escherichia coli", "Streptococcus pyogenes"],
+                             "Original Species": ["E. coli", "S. pyogenes"]})
+    metadata = pd.DataFrame({"sample_id": ["S1", "S2"], "array_id": ["a-424_A01", "a-424_A02"], "age": [29, 31]})
+
+    invoke(columnar.write_otu_parquet, otu_matrix)
+    invoke(columnar.write_taxonomy_parquet, taxonomy)
+    invoke(columnar.write_metadata_parquet, metadata)
+    return out_dir
+
+
+def test_parquet_exports_are_typed(exports):
+    otu_table = pd.read_parquet(exports / "otu_table.parquet")
+    taxonomy = pd.read_parquet(exports / "taxonomy.parquet")
+    metadata = pd.read_parquet(exports / "metadata.parquet")
+
+    assert otu_table["Species"].tolist() == ["Escherichia coli", "Streptococcus pyogenes"]
+    assert isinstance(otu_table["Species"].dtype, pd.CategoricalDtype)
+    assert (otu_table[["S1", "S2"]].dtypes == np.uint8).all()
+    assert otu_table[["S1", "S2"]].to_numpy().tolist() == [[1, 1], [0, 1]]
+    assert isinstance(taxonomy["Genus"].dtype, pd.CategoricalDtype)
+    assert metadata["age"].dtype == np.int64
+
+
+def test_write_duckdb_joins_exports(exports):
+    database = str(exports / "axioparse.duckdb")
+
+    invoke(columnar.write_duckdb, duckdb=DuckDBResource(database=database))
+
+    with duckdb.connect(database) as conn:
+        rows = conn.execute("SELECT Species, sample_id, Genus, age FROM presence ORDER BY Species, sample_id").fetchall()
+    assert rows == [("Escherichia coli", "S1", "Escherichia", 29), ("Escherichia coli", "S2", "Escherichia", 31),
+                    ("Streptococcus pyogenes", "S2", "Streptococcus", 31)]
@@ -0,0 +1,103 @@
+import time
+import pandas as pd
+from dagster import AssetCheckSeverity, DagsterInstance, asset, materialize
+from axioparse_pipeline import assets, extra_functions, instrumentation
+from .invoke import invoke
+from .test_taxonomy import species_coverage
+
+# how long slow_asset sleeps, changed between materializations
+delay = {"seconds": 0.0}
+
+
+@instrumentation.instrumented_asset()
+def probes():
+    return pd.DataFrame({"Probe": ["a", "b", "c"], "S1": [1, 0, 1]})
+
+
+@instrumentation.instrumented_asset()
+def slow_asset(probes):
+    time.sleep(delay["seconds"])
+    return probes.head(2)
+
+
+def test_instrument_records_timing_and_shapes():
+    result = materialize([probes, slow_asset])
+
+    metadata = {key: value.value for key, value in result.asset_materializations_for_node("slow_asset")[0].metadata.items()}
+    assert metadata["wall_time_s"] >= 0
+    assert "peak_rss_delta_mb" in metadata
+    assert (metadata["input_probes_rows"], metadata["input_probes_columns"]) == (3, 2)
+    assert (metadata["rows"], metadata["columns"]) == (2, 2)
+
+
+def test_instrument_runs_outside_dagster():
+    assert len(invoke(slow_asset, invoke(probes))) == 2
+
+
+def test_performance_check_warns_on_a_slowdown(monkeypatch):
+    monkeypatch.setattr(instrumentation, "NOISE_FLOOR", {"wall_time_s": 0.05})
+
+    with DagsterInstance.ephemeral() as instance:
+        first = materialize([probes, slow_asset], instance=instance)
+        delay["seconds"] = 0.2
+        try:
+            second = materialize([probes, slow_asset], instance=instance, selection=["slow_asset"])
+        finally:
+            delay["seconds"] = 0.0
+
+    assert len(first.get_asset_check_evaluations()) == 2
+    assert all(evaluation.passed for evaluation in first.get_asset_check_evaluations())
+    # the check ran in the asset's own step
+    assert {event.step_key for event in second.all_events if event.step_key} == {"slow_asset"}
+    [evaluation] = second.get_asset_check_evaluations()
+    assert not evaluation.passed
+    assert evaluation.severity == AssetCheckSeverity.WARN
+    assert "wall_time_s" in evaluation.metadata
+
+
+def test_ncbi_check_warns_on_retries(fake_entrez, monkeypatch):
+    species_cov, filter_taxa = species_coverage()
+    monkeypatch.setattr(extra_functions.Entrez, "email", "test@example.com")
+    monkeypatch.setattr(extra_functions.Entrez, "api_key", "key")
+    fake_entrez.throttle = 1
+
+    @asset(name="read_species_coverage")
+    def coverage():
+        return species_cov
+
+    @asset(name="filter_taxa")
+    def taxa():
+        return filter_taxa
+
+    result = materialize([coverage, taxa, assets.enrich_taxonomy_table])
+
+    evaluations = {evaluation.check_name: evaluation for evaluation in result.get_asset_check_evaluations()}
+    assert set(evaluations) == {"performance_regression", "ncbi_requests_healthy"}
+    assert not evaluations["ncbi_requests_healthy"].passed
+    assert evaluations["ncbi_requests_healthy"].metadata["ncbi_retries"].value == 1
+
+
+def test_search_stats_record_fallback_depth(fake_entrez):
+    species_cov, _ = species_coverage()
+    extra_functions.reset_search_stats()
+
+    for probe in species_cov["Species"]:
+        extra_functions.fallback_search(probe)
+
+    assert set(extra_functions.search_stats()["ncbi_slowest_searches_s"]) == \
+        {"Escherichia coli", "Streptococcus pyogenes ABC", "Streptococcus pyogenes"}
+
+    # a probe that no search matches counts as dropping all of its words
+    extra_functions.fallback_search("Nonexistus bacterium")
+    stats = extra_functions.search_stats()
+    assert stats["ncbi_fallback_depths"] == {"0": 1, "1": 1, "2": 1}
+    assert stats["ncbi_fallback_max_depth"] == 2
+
+
+def test_validate_api_does_not_print_the_key(monkeypatch, capsys):
+    monkeypatch.setattr(extra_functions.Entrez, "email", "test@example.com")
+    monkeypatch.setattr(extra_functions.Entrez, "api_key", "secret-key")
+
+    extra_functions.validate_api()
+
+    assert "secret-key" not in capsys.readouterr().out
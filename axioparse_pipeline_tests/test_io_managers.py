@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dagster import build_input_context, build_output_context, materialize
+from axioparse_pipeline import assets, extra_functions
+from axioparse_pipeline.io_managers import ArrowIOManager, arrow_io_manager
+from axioparse_pipeline.otu_matrix import OtuMatrix
+from .invoke import invoke
+
+
+def round_trip(tmp_path, obj):
+    manager = ArrowIOManager(tmp_path)
+    manager.handle_output(build_output_context(asset_key="some_asset"), obj)
+    return manager.load_input(build_input_context(asset_key="some_asset", upstream_output=build_output_context(asset_key="some_asset")))
+
+
+def test_arrow_io_manager_keeps_dataframe_dtypes(tmp_path):
+    otu_table = pd.DataFrame({"Probe": ["a", "b"],
+                              "S1": pd.Categorical(["DETECTED", None], dtype=extra_functions.DETECTION_DTYPE),
+                              "S2": np.array([0, 1], dtype=np.uint8)})
+
+    loaded = round_trip(tmp_path, otu_table)
+
+    assert (tmp_path / "some_asset.arrow").read_bytes().startswith(b"ARROW1")
+    pd.testing.assert_frame_equal(loaded, otu_table)
+
+
+@pytest.mark.parametrize("obj", [OtuMatrix(np.eye(2, dtype=np.uint8), ["a", "b"], ["S1", "S2"]), None,
+                                 pd.DataFrame({"mixed": [1, "one"]})])
+def test_arrow_io_manager_pickles_everything_else(tmp_path, obj):
+    loaded = round_trip(tmp_path, obj)
+
+    if isinstance(obj, OtuMatrix):
+        assert (loaded.values != obj.values).nnz == 0
+        assert loaded.species.tolist() == obj.species.tolist()
+    elif isinstance(obj, pd.DataFrame):
+        pd.testing.assert_frame_equal(loaded, obj)
+    else:
+        assert loaded is None
+
+
+@pytest.mark.data_in
+def test_arrow_io_manager_in_a_run(tmp_path):
+    result = materialize([assets.read_metadata, assets.read_otu, assets.replace_sample_names],
+                         resources={"io_manager": arrow_io_manager.configured({"base_dir": str(tmp_path)})})
+
+    assert result.success
+    otu_table = result.output_for_node("replace_sample_names")
+    assert (otu_table.dtypes.iloc[1:] == extra_functions.DETECTION_DTYPE).all()
+
+
+def test_taxonomy_and_metadata_assets_leave_their_inputs_alone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data_out").mkdir()
+    tax_table = pd.DataFrame({col: ["x", "x"] for col in assets.TAX_COLUMNS})
+    tax_table["Species"] = ["b", "a"]
+    metadata = pd.DataFrame({"sample_id": ["S1"], "array_id": ["a-424_A01"]})
+    deduplicated = invoke(assets.remove_duplicate_species, tax_table)
+    inputs = [tax_table.copy(), deduplicated.copy(), metadata.copy()]
+
+    invoke(assets.format_tax_for_qiime, deduplicated)
+    invoke(assets.write_metadata_r, metadata)
+
+    pd.testing.assert_frame_equal(tax_table, inputs[0])
+    pd.testing.assert_frame_equal(deduplicated, inputs[1])
+    pd.testing.assert_frame_equal(metadata, inputs[2])
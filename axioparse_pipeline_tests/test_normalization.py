@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from axioparse_pipeline import assets, normalization
+
+
+def test_sanitize_otu_ids_matches_column_passes():
+    names = pd.Series(["Escherichia coli", "Candidatus Sulcia (endosymbiont)", "x( y", "[Clostridium] leptum",
+                       "Phage:T4", "a_ (b)", "**_"], dtype=object)
+    expected = (names.str.replace(' ', '_').str.replace(r'[\(\)\[\]:]', '*', regex=True).str.replace('*_', '_')
+                .str.replace('*', '_').str.rstrip('_').str.lstrip('_').str.replace('_', ' '))
+
+    assert normalization.sanitize_otu_ids(names.to_numpy()).tolist() == expected.tolist()
+
+
+def test_sanitize_otu_ids_rejects_collisions():
+    with pytest.raises(ValueError, match=r"'Clostridium leptum': \['Clostridium leptum', '\[Clostridium\] leptum'\]"):
+        normalization.sanitize_otu_ids(["Clostridium leptum", "[Clostridium] leptum", "Escherichia coli"])
+
+
+def test_map_unique_broadcasts_through_categorical_codes():
+    values = pd.Categorical(["b", "a", None, "b"], categories=["a", "b", "c"])
+    calls = []
+
+    result = normalization.map_unique(values, lambda value: calls.append(value) or value.upper())
+
+    assert result[[0, 1, 3]].tolist() == ["B", "A", "B"]
+    assert pd.isnull(result[2])
+    assert calls == ["a", "b", "c"]
+
+
+def test_map_species_leaves_unmatched_names_empty():
+    result = normalization.map_species(pd.Series(["E. coli", "unknown", "E. coli"]), {"E. coli": "Escherichia coli"})
+
+    assert result.tolist() == ["Escherichia coli", None, "Escherichia coli"]
+
+
+def test_taxonomy_strings_match_row_format():
+    tax_table = pd.DataFrame({col: ["x", np.nan] for col in assets.TAX_COLUMNS})
+    tax_table["Species"] = ["Escherichia coli", "Homo sapiens"]
+    expected = tax_table.apply(
+        lambda row: f'd_{row["Domain"]}; k_{row["Kingdom"]}; p_{row["Phylum"]}; c_{row["Class"]}; o_{row["Order"]}; f_{row["Family"]}; g_{row["Genus"]}; s_{row["Species"]}', axis=1)
+
+    assert normalization.taxonomy_strings(tax_table).tolist() == expected.tolist()
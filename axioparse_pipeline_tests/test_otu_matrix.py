@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from axioparse_pipeline import otu_matrix
+from axioparse_pipeline.otu_matrix import OtuMatrix
+
+
+def test_from_frame_stores_only_detections():
+    otu_table = pd.DataFrame({"Species": ["a", "b", "c"],
+                              "S1": [np.nan, "DETECTED", np.nan],
+                              "S2": ["Secondary", np.nan, np.nan]})
+
+    matrix = OtuMatrix.from_frame(otu_table)
+
+    assert matrix.values.nnz == 2
+    assert matrix.samples.tolist() == ["S1", "S2"]
+    assert matrix.values.toarray().tolist() == [[0, 1], [2, 0], [0, 0]]
+
+
+def test_group_max_matches_pandas_groupby():
+    rng = np.random.default_rng(0)
+    states = rng.choice([0, 0, 0, 1, 2], size=(40, 6)).astype(np.int8)
+    species = rng.choice(["a", "b", "c", "d"], size=40)
+
+    result = OtuMatrix(states, species, [f"S{j}" for j in range(6)]).group_max()
+
+    expected = pd.DataFrame(states).groupby(species, sort=True).max()
+    assert result.species.tolist() == expected.index.tolist()
+    np.testing.assert_array_equal(result.values.toarray(), expected.to_numpy())
+    assert result.values.dtype == np.int8
+
+
+def test_hstack_aligns_species():
+    left = OtuMatrix(np.array([[1], [1]], dtype=np.uint8), ["b", "c"], ["S1"])
+    right = OtuMatrix(np.array([[1], [0]], dtype=np.uint8), ["a", "c"], ["S2"])
+
+    result = otu_matrix.hstack([left, right])
+
+    assert result.species.tolist() == ["a", "b", "c"]
+    assert result.to_frame().to_dict("list") == {"Species": ["a", "b", "c"], "S1": [0, 1, 1], "S2": [1, 0, 0]}
+
+
+def test_select_samples_rejects_unknown_samples():
+    matrix = OtuMatrix(np.zeros((1, 1), dtype=np.uint8), ["a"], ["S1"])
+
+    with pytest.raises(ValueError, match="S2"):
+        matrix.select_samples(["S2"])
@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+from dagster import build_asset_context
+from axioparse_pipeline import assets, extra_functions, partitions
+from .invoke import invoke
+
+
+def test_list_array_runs_keys_samples_by_dna_plate():
+    columns = ["Target Description", "chip-424_A01", "chip-428_A01", "chip-430_B02", "chip-431_B02", "chip-424_C03"]
+    metadata = pd.DataFrame({"array_id": ["chip-424_A01", "chip-430_B02"], "sample_id": ["s1", "s2"]})
+
+    assert extra_functions.list_array_runs(columns, metadata) == ["424", "430"]
+
+
+@pytest.mark.data_in
+def test_partitioned_assets_match_in_memory_path(data_in, in_memory_clean_otu):
+    metadata, species_cov, tax_table = data_in
+
+    header = pd.read_csv(assets.OTU_IN_PATH, sep='\t', nrows=0).columns
+    run_presence = {run_id: partitions.run_presence(build_asset_context(partition_key=run_id), metadata, species_cov)
+                    for run_id in extra_functions.list_array_runs(header, metadata)}
+    partitioned = invoke(partitions.delete_extra_samples, metadata, tax_table, run_presence)
+
+    pd.testing.assert_frame_equal(partitioned.to_frame(), in_memory_clean_otu["delete_extra_samples"].to_frame())
+
+    # a single partition is handed over without the dict around it
+    if len(run_presence) == 1:
+        single = invoke(partitions.delete_extra_samples, metadata, tax_table, next(iter(run_presence.values())))
+        pd.testing.assert_frame_equal(single.to_frame(), partitioned.to_frame())
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+from axioparse_pipeline import sharded
+from axioparse_pipeline.otu_matrix import OtuMatrix
+
+
+@pytest.mark.data_in
+@pytest.mark.parametrize("workers", [1, 2, 3, 64])
+def test_sharded_matches_serial_path(workers, data_in, in_memory_clean_otu):
+    serial = in_memory_clean_otu["delete_extra_samples"]
+
+    result = sharded.sharded_clean_otu(in_memory_clean_otu["replace_species_names"], data_in[0], workers)
+
+    assert result.values.dtype == serial.values.dtype
+    assert (result.values != serial.values).nnz == 0
+    assert result.species.tolist() == serial.species.tolist()
+    assert result.samples.tolist() == serial.samples.tolist()
+
+
+def test_sharded_reports_unexpected_cells():
+    metadata = pd.DataFrame({"sample_id": ["S1"], "array_id": ["a1-2-3-424_A01"]})
+    otu_matrix = OtuMatrix(np.array([[2, 0], [0, -1]], dtype=np.int8), ["a", "b"], ["S1", "a1-2-3-428_A01"])
+
+    with pytest.raises(ValueError, match="row 1 and column 2"):
+        sharded.sharded_clean_otu(otu_matrix, metadata, 2)
+
+
+def test_shard_pairs_keeps_column_order():
+    shards = sharded.shard_pairs(7, 3)
+
+    assert [shard.tolist() for shard in shards] == [[0, 1, 2], [3, 4], [5, 6]]
+    assert len(sharded.shard_pairs(2, 8)) == 2
+    assert sharded.shard_pairs(0, 4) == []
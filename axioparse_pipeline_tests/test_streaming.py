@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+from axioparse_pipeline import assets, streaming
+from .invoke import invoke
+
+
+@pytest.mark.data_in
+@pytest.mark.parametrize("chunksize", [50, 137, 10000])
+def test_streaming_matches_in_memory_path(chunksize, data_in, in_memory_clean_otu):
+    metadata, species_cov, tax_table = data_in
+    mapping = dict(zip(tax_table["Original Species"], tax_table["Species"]))
+
+    # the Bacteroides species collapse into one, which exercises the duplicate merge across chunks
+    streamed = streaming.stream_clean_otu(assets.OTU_IN_PATH, metadata, species_cov, mapping, chunksize)
+
+    pd.testing.assert_frame_equal(streamed.to_frame(), in_memory_clean_otu["delete_extra_samples"].to_frame())
+
+
+@pytest.mark.data_in
+def test_streaming_merge_samples_to_otu_lists_the_same_species(data_in, in_memory_clean_otu):
+    streamed = invoke(streaming.merge_samples_to_otu, data_in[1])
+
+    assert set(streamed["Species"]) == set(in_memory_clean_otu["merge_samples_to_otu"]["Species"])
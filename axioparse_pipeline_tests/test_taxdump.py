@@ -0,0 +1,57 @@
+import os
+import pytest
+from dagster import build_asset_context
+from axioparse_pipeline import assets, extra_functions, taxdump
+from .test_taxonomy import species_coverage
+from .invoke import invoke
+
+TAXDUMP_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "taxdump")
+
+
+@pytest.fixture
+def index(tmp_path):
+    taxdump.build_taxdump_index(TAXDUMP_DIR, str(tmp_path / "index"))
+    return taxdump.TaxdumpIndex(str(tmp_path / "index"))
+
+
+def test_taxdump_index_matches_entrez_records(index, fake_entrez):
+    client = extra_functions.get_ncbi_client()
+
+    assert index.esearch("escherichia  COLI") == client.esearch("Escherichia coli") == ["562"]
+    assert index.esearch("Bacillus coli") == ["562"]
+    assert index.esearch("Streptococcus pyogenes") == ["1314"]
+    assert index.esearch("Streptococcus pyogenes ABC") == []
+
+    for local, remote in zip(index.efetch(["562", "1314"]), client.efetch(["562", "1314"])):
+        assert local["ScientificName"] == remote["ScientificName"]
+        assert local["LineageEx"] == [dict(taxon) for taxon in remote["LineageEx"]]
+
+    assert index.efetch(["7", "424242"])[0]["AkaTaxIds"] == ["7"]
+    assert len(index.efetch(["424242"])) == 0
+
+
+def test_taxdump_index_leaves_out_broken_lineages(index):
+    with pytest.warns(UserWarning, match="Tax id 999 has an ancestor missing"):
+        assert index.efetch(["999", "562"])[0]["TaxId"] == "562"
+    with pytest.warns(UserWarning, match="Tax id 1002 has an ancestor missing"):
+        assert index.efetch(["1002"]) == []
+
+
+def test_enrich_taxonomy_table_offline(index, cache, fake_entrez, monkeypatch):
+    species_cov, filter_taxa = species_coverage()
+    monkeypatch.setattr(extra_functions.Entrez, "email", "test@example.com")
+    monkeypatch.setattr(extra_functions.Entrez, "api_key", "key")
+    online = invoke(assets.enrich_taxonomy_table, build_asset_context(), species_cov, filter_taxa)
+    cached_rows = [cache.connection.execute(f"SELECT key, value FROM {table}").fetchall()
+                   for table in ("esearch", "efetch")]
+
+    # the offline run neither reads the lineages NCBI put in the cache nor adds its own
+    monkeypatch.setattr(extra_functions, "_client", index)
+    monkeypatch.setattr(extra_functions, "TAXDUMP_INDEX_DIR", "index")
+    monkeypatch.setattr(extra_functions.Entrez, "api_key", None)
+    offline = invoke(assets.enrich_taxonomy_table, build_asset_context(), species_cov, filter_taxa)
+
+    assert offline.equals(online)
+    assert cache.stats() == {"ncbi_cache_hits": 0, "ncbi_cache_misses": 0}
+    assert [cache.connection.execute(f"SELECT key, value FROM {table}").fetchall()
+            for table in ("esearch", "efetch")] == cached_rows
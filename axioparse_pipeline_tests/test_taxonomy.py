@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+from dagster import build_asset_context
+from axioparse_pipeline import assets, extra_functions, ncbi_client
+from .invoke import invoke
+
+
+def species_coverage():
+    '''
+    Return a two-species coverage table and its filter_taxa subset. the second species needs the fallback search
+    '''
+    species_cov = pd.DataFrame({"Probe": ["Escherichia coli SCI-07 draft (68 frags)",
+                                          "Streptococcus pyogenes ABC020038545 draft (2 frags)"],
+                                "Domain": ["BacteriaFamilies", "BacteriaFamilies"],
+                                "Family": ["Enterobacteriaceae", "Streptococcaceae"],
+                                "Species": ["Escherichia coli", "Streptococcus pyogenes ABC"]})
+    return species_cov, species_cov[["Domain", "Family", "Species"]]
+
+
+def efetch_ids(fake):
+    return [params["id"] for utility, params in fake.requests if utility == "efetch.fcgi"]
+
+
+def test_fetch_taxonomy_batch_chunks_requests(fake_entrez):
+    fake_entrez.merged["7"] = "562"
+
+    records = extra_functions.fetch_taxonomy_batch(["562", "1314", "561", "7", "562"], batch_size=2)
+
+    assert sorted(efetch_ids(fake_entrez)) == ["561,7", "562,1314"]
+    assert records["7"]["ScientificName"] == "Escherichia coli"
+    assert sorted(records) == ["1314", "561", "562", "7"]
+
+    # a second call is served entirely from the cache
+    extra_functions.fetch_taxonomy_batch(["562", "1314", "561", "7"], batch_size=2)
+    assert len(efetch_ids(fake_entrez)) == 2
+
+
+def test_fetch_taxonomy_batch_splits_failing_chunks(fake_entrez):
+    fake_entrez.fail_ids.add("99")
+
+    with pytest.warns(UserWarning, match=r"Failed to fetch tax ids \['99'\]"):
+        records = extra_functions.fetch_taxonomy_batch(["562", "99", "1314"], batch_size=2)
+
+    # the client retries the HTTP 500s itself, and each failing chunk is then split without another round of retries
+    attempts = extra_functions.get_ncbi_client().retry + 1
+    assert sorted(efetch_ids(fake_entrez)) == sorted(["562,99"] * attempts + ["562", "1314"] + ["99"] * attempts)
+    assert sorted(records) == ["1314", "562"]
+
+
+def test_client_backs_off_on_throttling(fake_entrez):
+    fake_entrez.throttle = 2
+    client = extra_functions.get_ncbi_client()
+
+    assert client.esearch("Escherichia coli") == ["562"]
+    assert client.stats()["ncbi_requests"] == 3
+    assert client.stats()["ncbi_retries"] == 2
+
+
+def test_client_retries_dropped_connections(fake_entrez):
+    fake_entrez.disconnect = 2
+    client = extra_functions.get_ncbi_client()
+
+    assert client.esearch("Escherichia coli") == ["562"]
+    assert client.stats()["ncbi_retries"] == 2
+
+
+def test_retry_after_falls_back_to_backoff_unless_given_in_seconds():
+    assert ncbi_client.retry_after_seconds("2") == 2.0
+    assert ncbi_client.retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert ncbi_client.retry_after_seconds(None) is None
+
+
+def test_client_can_be_used_again_after_close(fake_entrez):
+    client = extra_functions.get_ncbi_client()
+    with client:
+        assert client.map(client.esearch, ["Escherichia coli"]) == [["562"]]
+    assert client.executor is None
+
+    assert client.map(client.esearch, ["Escherichia coli"]) == [["562"]]
+    client.close()
+
+
+def test_token_bucket_limits_request_rate():
+    bucket = ncbi_client.TokenBucket(rate=20)
+    start = ncbi_client.time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+
+    assert ncbi_client.time.monotonic() - start >= 4 / 20
+
+
+def test_enrich_taxonomy_table_uses_fallback_search(fake_entrez, monkeypatch):
+    monkeypatch.setattr(extra_functions.Entrez, "email", "test@example.com")
+    monkeypatch.setattr(extra_functions.Entrez, "api_key", "key")
+    species_cov, filter_taxa = species_coverage()
+
+    tax_df = invoke(assets.enrich_taxonomy_table, build_asset_context(), species_cov, filter_taxa)
+
+    assert tax_df["Species"].tolist() == ["Escherichia coli", "Streptococcus pyogenes"]
+    assert tax_df.iloc[0][["Domain", "Phylum", "Family", "Genus"]].tolist() == \
+        ["Bacteria", "Pseudomonadota", "Enterobacteriaceae", "Escherichia"]
+    assert len(efetch_ids(fake_entrez)) == 1
+
+    # an unchanged re-run is answered from the cache without any requests
+    request_count = len(fake_entrez.requests)
+    invoke(assets.enrich_taxonomy_table, build_asset_context(), species_cov, filter_taxa)
+    assert len(fake_entrez.requests) == request_count
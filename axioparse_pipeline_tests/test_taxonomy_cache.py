@@ -0,0 +1,54 @@
+import os
+from axioparse_pipeline import extra_functions, taxonomy_cache
+
+
+def test_search_results_are_keyed_by_normalized_term(cache):
+    cache.put_search("Escherichia  Coli", ["562"])
+
+    assert cache.get_search(" escherichia coli ") == ["562"]
+    assert cache.get_search("Escherichia") is None
+    assert cache.stats() == {"ncbi_cache_hits": 1, "ncbi_cache_misses": 1}
+
+
+def test_expired_refreshed_and_evicted_entries_are_misses(cache, monkeypatch):
+    cache.max_entries = 2
+    cache.put_lineage("1", {"ScientificName": "a"})
+    cache.put_lineage("2", {"ScientificName": "b"})
+    cache.get_lineage("1")
+    cache.put_lineage("3", {"ScientificName": "c"})
+    assert cache.connection.execute("SELECT COUNT(*) FROM efetch").fetchone()[0] == 3
+    cache.flush()
+
+    # "2" was the least recently used entry when the table was trimmed to max_entries
+    assert cache.get_lineage("2") is None
+    assert cache.get_lineage("1") == {"ScientificName": "a"}
+
+    monkeypatch.setattr(taxonomy_cache.time, "time", lambda: 1e12)
+    assert cache.get_lineage("3") is None
+
+    refreshed = taxonomy_cache.TaxonomyCache(cache_dir=os.path.dirname(cache.path), refresh=True)
+    assert refreshed.get_lineage("1") is None
+
+
+def test_cached_lookups_skip_entrez(cache, monkeypatch):
+    cache.put_search("Escherichia coli", ["562"])
+    cache.put_lineage("562", {"ScientificName": "Escherichia coli", "LineageEx": []})
+
+    def offline(*args, **kwargs):
+        raise AssertionError("NCBI should not be called for cached lookups")
+    monkeypatch.setattr(extra_functions, "get_ncbi_client", offline)
+
+    assert extra_functions.search_ncbi_taxonomy("Escherichia coli") == ["562"]
+    assert extra_functions.fetch_taxonomy_data("562", "Escherichia coli")["ScientificName"] == "Escherichia coli"
+
+
+def test_empty_search_results_expire_sooner(cache, monkeypatch):
+    cache.empty_ttl_seconds = 60
+    cache.put_search("Escherichia coli", ["562"])
+    cache.put_search("Nonexistus bacterium", [])
+    assert cache.get_search("Nonexistus bacterium") == []
+
+    now = taxonomy_cache.time.time()
+    monkeypatch.setattr(taxonomy_cache.time, "time", lambda: now + 120)
+    assert cache.get_search("Nonexistus bacterium") is None
+    assert cache.get_search("Escherichia coli") == ["562"]
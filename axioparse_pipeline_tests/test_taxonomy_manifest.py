@@ -0,0 +1,61 @@
+import time
+from dagster import build_asset_context
+from axioparse_pipeline import assets, extra_functions, taxonomy_manifest
+from .test_taxonomy import species_coverage
+from .invoke import invoke
+
+
+def test_manifest_is_keyed_by_coverage_content_and_backend(cache):
+    species_cov, _ = species_coverage()
+    tax_df = assets.pd.DataFrame([["Bacteria", "", "", "", "", "", "", "Escherichia coli", "Escherichia coli"]],
+                                 columns=assets.TAX_COLUMNS)
+    taxonomy_manifest.write_manifest(species_cov, "ncbi", tax_df)
+
+    assert taxonomy_manifest.load_manifest(species_cov, "ncbi").equals(tax_df)
+    assert taxonomy_manifest.load_manifest(species_cov, "taxdump") is None
+
+    changed_cov = species_cov.copy()
+    changed_cov.loc[0, "Family"] = "Something else"
+    assert taxonomy_manifest.load_manifest(changed_cov, "ncbi") is None
+
+
+def test_manifest_expires_and_refreshes_like_the_cache(cache, monkeypatch):
+    species_cov, _ = species_coverage()
+    tax_df = assets.pd.DataFrame([["Bacteria", "", "", "", "", "", "", "Escherichia coli", "Escherichia coli"]],
+                                 columns=assets.TAX_COLUMNS)
+    taxonomy_manifest.write_manifest(species_cov, "ncbi", tax_df)
+
+    assert taxonomy_manifest.load_manifest(species_cov, "ncbi", refresh=True) is None
+    assert taxonomy_manifest.load_manifest(species_cov, "ncbi", ttl_seconds=60) is not None
+    built_at = time.time()
+    monkeypatch.setattr(taxonomy_manifest.time, "time", lambda: built_at + 120)
+    assert taxonomy_manifest.load_manifest(species_cov, "ncbi", ttl_seconds=60) is None
+
+
+def test_enrich_taxonomy_table_joins_against_manifest(fake_entrez, monkeypatch):
+    species_cov, filter_taxa = species_coverage()
+    monkeypatch.setattr(extra_functions.Entrez, "email", "test@example.com")
+    monkeypatch.setattr(extra_functions.Entrez, "api_key", "key")
+    monkeypatch.setattr(taxonomy_manifest, "BUILD_MANIFEST", True)
+
+    # the first run resolves the whole coverage file even though only one species is needed
+    first = invoke(assets.enrich_taxonomy_table, build_asset_context(), species_cov, filter_taxa.iloc[[1]])
+    assert first["Species"].tolist() == ["Streptococcus pyogenes"]
+    assert len(taxonomy_manifest.load_manifest(species_cov, "ncbi")) == 2
+
+    # later runs are a pure join without any lookups
+    resolved = []
+    resolve_taxonomy = extra_functions.resolve_taxonomy
+    monkeypatch.setattr(extra_functions, "resolve_taxonomy",
+                        lambda tax_table, *args: resolved.append(len(tax_table)) or resolve_taxonomy(tax_table, *args))
+    second = invoke(assets.enrich_taxonomy_table, build_asset_context(), species_cov, filter_taxa.iloc[::-1])
+    assert second["Original Species"].tolist() == ["Streptococcus pyogenes ABC", "Escherichia coli"]
+    assert second.iloc[1]["Genus"] == "Escherichia"
+    assert resolved == [0]
+
+    # a cache refresh rebuilds the manifest from fresh lookups
+    extra_functions.get_taxonomy_cache().refresh = True
+    request_count = len(fake_entrez.requests)
+    invoke(assets.enrich_taxonomy_table, build_asset_context(), species_cov, filter_taxa)
+    assert resolved[1:] == [2, 0]
+    assert len(fake_entrez.requests) > request_count
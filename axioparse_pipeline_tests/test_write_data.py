@@ -0,0 +1,32 @@
+import biom
+import numpy as np
+import pytest
+from axioparse_pipeline import assets
+from axioparse_pipeline.otu_matrix import OtuMatrix
+from .invoke import invoke
+
+
+@pytest.mark.parametrize("biom_format", ["json", "hdf5"])
+def test_write_otu_qiime_round_trips(tmp_path, monkeypatch, biom_format):
+    if biom_format == "hdf5":
+        pytest.importorskip("h5py")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data_out").mkdir()
+    monkeypatch.setattr(assets, "BIOM_FORMAT", biom_format)
+    values = np.array([[1, 0, 1], [0, 0, 0], [0, 1, 1]], dtype=np.uint8)
+
+    invoke(assets.write_otu_qiime,
+           OtuMatrix(values, ["Escherichia coli", "Homo sapiens", "Streptococcus"], ["S1", "S 2", "S3"]))
+
+    table = biom.load_table(str(tmp_path / "data_out" / "otu_table_qiime.biom"))
+    assert list(table.ids(axis="observation")) == ["Escherichia_coli", "Homo_sapiens", "Streptococcus"]
+    assert list(table.ids(axis="sample")) == ["S1", "S_2", "S3"]
+    np.testing.assert_array_equal(table.matrix_data.toarray(), values)
+
+
+def test_write_otu_qiime_rejects_unknown_format(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(assets, "BIOM_FORMAT", "tsv")
+
+    with pytest.raises(ValueError, match="Unknown biom format"):
+        invoke(assets.write_otu_qiime, OtuMatrix(np.zeros((1, 1), dtype=np.uint8), ["a"], ["S1"]))
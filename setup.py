@@ -13,10 +13,13 @@ setup(
         "dagster-cloud~=1.8.1",
         "pandas~=2.2.2",
         "numpy~=1.26.4",
+        "scipy",
+        "pyarrow",
         "biopython~=1.78",
         "python-dotenv~=1.0.1",
         "scikit-bio~=0.6.0",
         "pytest~=8.2.1",
         "dagster-webserver~=1.8.1"],
-    extras_require={"dev": ["dagster-webserver", "pytest"]},
+    extras_require={"dev": ["dagster-webserver", "pytest"], "hdf5": ["h5py"]},
+    entry_points={"console_scripts": ["axioparse = axioparse_pipeline.cli:main"]},
 )